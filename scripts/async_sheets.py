@@ -0,0 +1,47 @@
+import asyncio
+from urllib.parse import quote
+import aiohttp
+from sheet_batch import a1
+import instrument
+
+# %%
+
+SHEETS_URL = "https://sheets.googleapis.com/v4/spreadsheets"
+
+class AsyncSheets:
+  """Creates month worksheets concurrently straight against the Sheets REST API. Months are independent of each other so
+  up to `concurrency` of them are in flight at once, but each month still goes duplicate -> show -> update in order"""
+  def __init__(self, sheet_id, token, limiter, concurrency=8, base_url=SHEETS_URL):
+    self.url = f"{base_url}/{sheet_id}"
+    self.headers = {"Authorization": f"Bearer {token}"}
+    self.limiter = limiter
+    self.concurrency = concurrency
+    self.round_trips = 0
+
+  async def __request(self, session, kind, method, url, **kwargs):
+    async def send():
+      self.round_trips += 1
+      async with session.request(method, url, headers=self.headers, **kwargs) as response:
+        response.raise_for_status()
+        return await response.json()
+    return await self.limiter.call_async(kind, send)
+
+  async def __batch_update(self, session, requests):
+    return await self.__request(session, "write", "POST", f"{self.url}:batchUpdate", json={"requests": requests})
+
+  async def __create_month(self, session, semaphore, source_id, sheet_id, title, rows):
+    async with semaphore:
+      await self.__batch_update(session, [{"duplicateSheet": {"sourceSheetId": source_id, "newSheetName": title, "newSheetId": sheet_id}}])
+      await self.__batch_update(session, [{"updateSheetProperties": {"properties": {"sheetId": sheet_id, "hidden": False}, "fields": "hidden"}}])
+      cell_range = a1(title, "A2:D1000")
+      await self.__request(session, "write", "PUT", f"{self.url}/values/{quote(cell_range)}", params={"valueInputOption": "RAW"}, json={"range": cell_range, "values": rows})
+      instrument.count("cells_written", sum(len(row) for row in rows))
+
+  async def create_months_async(self, source_id, months):
+    semaphore = asyncio.Semaphore(self.concurrency)
+    async with aiohttp.ClientSession() as session:
+      await asyncio.gather(*[self.__create_month(session, semaphore, source_id, *month) for month in months])
+
+  def create_months(self, source_id, months):
+    """Duplicate the source worksheet once per (sheet id, title, rows) in months and fill in each copy"""
+    asyncio.run(self.create_months_async(source_id, months))
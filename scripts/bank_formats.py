@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+
+# %%
+
+@dataclass(frozen=True)
+class BankFormat:
+  """Everything DataParse needs to know about one bank's csv export"""
+  name: str
+  label: str
+  #source column -> normalized column (Date, Description, Amount and optionally Category), anything else is never read
+  columns: dict
+  #strftime format of the Date column
+  date_format: str
+  #1 if the export lists costs as positive amounts, -1 if it lists them as negative, None to go with whichever sign is more common
+  sign: int = None
+  #exact header line, looked up in the first few lines of the file
+  header: str = None
+  #headerless exports give their column names here and a test for the first line instead
+  names: tuple = None
+  detect: object = None
+
+FORMATS = {}
+SIGNATURES = {}
+
+def register(bank_format):
+  FORMATS[bank_format.name] = bank_format
+  if bank_format.header:
+    SIGNATURES[bank_format.header] = bank_format
+
+def sniff(file, head_bytes=4096, head_lines=8):
+  """Detect the format of a statement from its first few KB, returns the format and how many lines come before its header.
+  Each line is one dict lookup against the registered header signatures, headerless formats are tried last"""
+  with open(file, "r") as r:
+    lines = r.read(head_bytes).splitlines()[:head_lines]
+  for idx, line in enumerate(lines):
+    if line in SIGNATURES:
+      return SIGNATURES[line], idx
+  for bank_format in FORMATS.values():
+    if bank_format.detect and lines and bank_format.detect(lines[0]):
+      return bank_format, 0
+  return None, 0
+
+# %%
+
+register(BankFormat(
+  name="discover",
+  label="Discover card",
+  header="Trans. Date,Post Date,Description,Amount,Category",
+  columns={"Trans. Date": "Date", "Description": "Description", "Amount": "Amount", "Category": "Category"},
+  date_format="%m/%d/%Y",
+  sign=1,
+))
+
+register(BankFormat(
+  name="usaa",
+  label="USAA Bank",
+  header="Date,Description,Original Description,Category,Amount,Status",
+  columns={"Date": "Date", "Description": "Description", "Amount": "Amount", "Category": "Category"},
+  date_format="%Y-%m-%d",
+  sign=-1,
+))
+
+register(BankFormat(
+  name="boa",
+  label="Bank of America",
+  header="Date,Description,Amount,Running Bal.",
+  columns={"Date": "Date", "Description": "Description", "Amount": "Amount"},
+  date_format="%m/%d/%Y",
+  sign=-1,
+))
+
+register(BankFormat(
+  name="mtb",
+  label="M&T Bank",
+  names=("Index", "Date", "Description", "Amount", "UNK", "Running Balance"),
+  detect=lambda line: "1," in line and "/" in line,
+  columns={"Date": "Date", "Description": "Description", "Amount": "Amount"},
+  date_format="%m/%d/%Y",
+))
@@ -0,0 +1,334 @@
+import os
+import io
+import asyncio
+import tempfile
+import argparse
+import random
+import datetime as dt
+from time import perf_counter
+from contextlib import redirect_stdout
+
+# %%
+
+def synthetic_rows(month, count):
+  """count fake transaction rows for a worksheet, the way SheetAPI writes them"""
+  merchants = ["AMZN MKTP US", "SUNOCO 0123", "WEGMANS #45", "NETFLIX.COM", "SHELL OIL 5531"]
+  first = dt.datetime.strptime(month, "%b %Y")
+  return [[(first + dt.timedelta(days=random.randint(0, 27))).strftime("%m/%d/%Y"), random.choice(merchants), random.randint(100, 20000) / 100, "UNK"] for _ in range(count)]
+
+def async_months(args):
+  """Wall-clock time to create month worksheets against a local fake Sheets server, sequentially and concurrently"""
+  from async_sheets import AsyncSheets
+  from fake_sheets import FakeWorkbook, serve
+  from rate_limit import QuotaLimiter
+
+  months = [(dt.datetime(2000, 1, 1) + dt.timedelta(days=31 * i)).strftime("%b %Y") for i in range(args.months)]
+  rows = {month: synthetic_rows(month, args.rows) for month in months}
+
+  async def run(concurrency):
+    workbook = FakeWorkbook()
+    workbook.add_sheet(0, "monthly_format", hidden=True)
+    runner, base_url = await serve(workbook, "bench", args.latency)
+    #quota is the fake server's problem here, give the limiter plenty of room
+    sheets = AsyncSheets("bench", "token", QuotaLimiter(10**6, 10**6), concurrency, base_url)
+    start = perf_counter()
+    await sheets.create_months_async(0, [(idx + 1, month, rows[month]) for idx, month in enumerate(months)])
+    elapsed = perf_counter() - start
+    await runner.cleanup()
+    assert len(workbook.sheets) == len(months) + 1
+    return elapsed, sheets.round_trips
+
+  print(f"{args.months} months, {args.rows} rows each, {args.latency * 1000:.0f} ms simulated latency")
+  for concurrency in [1, args.concurrency]:
+    elapsed, round_trips = asyncio.run(run(concurrency))
+    print(f"  concurrency {concurrency:>3}: {elapsed:7.2f}s wall clock, {round_trips} requests")
+
+def synthetic_statement(path, bank, count):
+  """Write a fake statement in the given bank's export layout"""
+  merchants = ["AMZN MKTP US*2K4", "SUNOCO 0123", "WEGMANS #45", "NETFLIX.COM", "SHELL OIL 5531", "PAYROLL ACME"]
+  first = dt.datetime(2015, 1, 1)
+  dates = sorted(first + dt.timedelta(days=random.randint(0, 3650)) for _ in range(count))
+  with open(path, "w") as w:
+    if bank == "discover":
+      w.write("Trans. Date,Post Date,Description,Amount,Category\n")
+      for date in dates:
+        w.write(f"{date:%m/%d/%Y},{date:%m/%d/%Y},{random.choice(merchants)},{random.randint(100, 200000) / 100:.2f},Merchandise\n")
+    elif bank == "usaa":
+      w.write("Date,Description,Original Description,Category,Amount,Status\n")
+      for date in dates:
+        w.write(f"{date:%Y-%m-%d},{random.choice(merchants)},{random.choice(merchants)},Shopping,-{random.randint(100, 200000) / 100:.2f},Posted\n")
+    elif bank == "mtb":
+      for idx, date in enumerate(dates):
+        w.write(f"{idx + 1},{date:%m/%d/%Y},{random.choice(merchants)},-{random.randint(100, 200000) / 100:.2f},,100.00\n")
+    elif bank == "boa":
+      w.write("Description,,Summary Amt.\nBeginning balance as of 01/01/2015,,\"1,000.00\"\n\nDate,Description,Amount,Running Bal.\n")
+      for date in dates:
+        w.write(f"{date:%m/%d/%Y},{random.choice(merchants)},\"-{random.randint(100, 200000) / 100:,.2f}\",\"1,000.00\"\n")
+
+def parsers(args):
+  """Rows per second through DataParse.parse_file for each bank format"""
+  from data_parse import DataParse
+  from bank_formats import FORMATS, sniff
+
+  dataparse = DataParse()
+  dataparse.set_settings_file({"categories": {"Food": ["wegmans"], "Car": ["sunoco", "shell"], "Media": ["netflix"]}})
+  with tempfile.TemporaryDirectory() as tmp:
+    for bank in FORMATS:
+      path = os.path.join(tmp, f"{bank}.csv")
+      synthetic_statement(path, bank, args.rows)
+      skiprows = sniff(path)[1]
+      timings = []
+      for _ in range(args.repeat):
+        start = perf_counter()
+        df = dataparse.parse_file(path, bank, skiprows)
+        timings.append(perf_counter() - start)
+      print(f"  {bank:>8}: {len(df) / min(timings):>12,.0f} rows/s ({len(df):,} rows, best of {args.repeat})")
+
+def synthetic_history(years, rows_per_month, categories):
+  """A DataParse holding `years` years of date sorted transactions, the way get_transaction_df leaves it"""
+  import numpy as np
+  import pandas as pd
+  from data_parse import DataParse
+
+  merchants = np.array(["AMZN MKTP US", "SUNOCO 0123", "WEGMANS #45", "NETFLIX.COM", "SHELL OIL 5531"])
+  generator = np.random.default_rng(0)
+  month_starts = pd.date_range(dt.datetime(2025 - years, 1, 1), periods=years * 12, freq="MS")
+  dates = np.repeat(month_starts.to_numpy(), rows_per_month) + pd.to_timedelta(generator.integers(0, 28, len(month_starts) * rows_per_month), unit="D").to_numpy()
+  dates.sort()
+
+  dataparse = DataParse()
+  dataparse.transaction_df = pd.DataFrame({"Date": dates, "Description": merchants[generator.integers(0, len(merchants), len(dates))],
+                                           "Amount": generator.integers(100, 20000, len(dates)), "Category": np.array(categories)[generator.integers(0, len(categories), len(dates))]})
+  return dataparse
+
+def template_workbook(latency, categories):
+  """An in-memory workbook holding just the monthly and yearly templates, laid out like budget_template.xlsx with a Total
+  row under the categories"""
+  from fake_sheets import FakeWorkbook
+
+  workbook = FakeWorkbook(latency)
+  monthly_format = {(0, 0): "Date", (0, 1): "Description", (0, 2): "Cost", (0, 3): "Category", (0, 5): "Category", (0, 6): "Total"}
+  #the yearly template's A1 is blank, its first row holds the month headers
+  yearly_format = {}
+  for idx, category in enumerate(categories + ["Total"]):
+    row = idx + 2
+    monthly_format[(row - 1, 5)] = category
+    monthly_format[(row - 1, 6)] = f"=SUMIF(D2:D1000,F{row},C2:C1000)" if category != "Total" else f"=SUM(G2:G{row - 1})"
+    yearly_format[(row - 1, 0)] = category
+    yearly_format[(row - 1, 1)] = f"='Jan 2000'!G{row}"
+  workbook.add_sheet(0, "monthly_format", hidden=True, cells=monthly_format)
+  workbook.add_sheet(1, "yearly_format", hidden=True, cells=yearly_format)
+  return workbook
+
+def state_files(directory):
+  """SheetAPI's checkpoint and rollup cache inside a scratch folder, so benchmarks never touch the real ones in scripts/"""
+  return {"checkpoint_file": os.path.join(directory, "sync_checkpoint.json"), "rollup_file": os.path.join(directory, "rollup_cache.json")}
+
+def sync(args):
+  """API calls, cells and wall-clock time of SheetAPI.execute against an in-memory workbook, for a fresh workbook and for
+  a second run with nothing to change"""
+  from sheet_api import SheetAPI
+
+  categories = ["Housing", "Car", "Food", "Media", "Personal"]
+  for years in args.years:
+    dataparse = synthetic_history(years, args.rows, categories)
+    workbook = template_workbook(args.latency, categories)
+
+    print(f"{years} year(s), {len(dataparse.transaction_df):,} transactions, {args.latency * 1000:.0f} ms simulated latency")
+    with tempfile.TemporaryDirectory() as state:
+      for run in ["initial", "no changes"]:
+        workbook.reset_counters()
+        start = perf_counter()
+        #the pipeline's progress lines would drown out the results
+        with redirect_stdout(io.StringIO()):
+          #quota isn't what's being measured, give the limiter plenty of room
+          SheetAPI("bench", dataparse, reads_per_minute=10**6, writes_per_minute=10**6, summary=args.summary, backend=workbook,
+                   **state_files(state)).execute()
+        elapsed = perf_counter() - start
+        calls = ", ".join(f"{key} {value}" for key, value in sorted(workbook.calls.items()))
+        print(f"  {run:>10}: {elapsed:7.2f}s wall clock, {sum(workbook.calls.values()):>3} calls ({calls}), {workbook.cells_read:,} cells read, {workbook.cells_written:,} written")
+
+def watch(args):
+  """Time from a new statement landing in the statements folder to an updated workbook, relaunching the whole pipeline
+  versus the watch mode's incremental sync"""
+  from data_parse import DataParse
+  from sheet_api import SheetAPI
+
+  settings = {"categories": {"Food": ["wegmans"], "Car": ["sunoco", "shell"], "Media": ["netflix"]}}
+  merchants = ["AMZN MKTP US*2K4", "SUNOCO 0123", "WEGMANS #45", "NETFLIX.COM", "SHELL OIL 5531", "TARGET T-1123"]
+
+  def statement(path, first, days, count):
+    with open(path, "w") as w:
+      w.write("Trans. Date,Post Date,Description,Amount,Category\n")
+      for date in sorted(first + dt.timedelta(days=random.randrange(days)) for _ in range(count)):
+        w.write(f"{date:%m/%d/%Y},{date:%m/%d/%Y},{random.choice(merchants)},{random.randint(100, 20000) / 100:.2f},Merchandise\n")
+
+  def pipeline(csv_dir, workbook):
+    dataparse = DataParse(csv_dir, interactive=False)
+    dataparse.set_settings_file(settings)
+    dataparse.get_transaction_df()
+    sheet_api = SheetAPI("bench", dataparse, reads_per_minute=10**6, writes_per_minute=10**6, backend=workbook, **state_files(csv_dir))
+    sheet_api.execute()
+    return dataparse, sheet_api
+
+  with tempfile.TemporaryDirectory() as csv_dir:
+    #one statement per year of history, then a month's worth of new transactions dropped in for each run
+    first = dt.datetime(2025 - args.years, 1, 1)
+    for year in range(args.years):
+      statement(os.path.join(csv_dir, f"history_{year}.csv"), dt.datetime(first.year + year, 1, 1), 365, args.rows * 12)
+    workbook = template_workbook(args.latency, ["Food", "Car", "Media", "UNK"])
+    with redirect_stdout(io.StringIO()):
+      dataparse, sheet_api = pipeline(csv_dir, workbook)
+
+    print(f"{args.years} year(s) of history, {len(dataparse.transaction_df):,} transactions, {args.latency * 1000:.0f} ms simulated latency")
+    for run, month in [("watch", 0), ("relaunch", 1)]:
+      statement(os.path.join(csv_dir, f"new_{run}.csv"), dt.datetime(2025, month + 1, 1), 28, args.rows)
+      workbook.reset_counters()
+      start = perf_counter()
+      with redirect_stdout(io.StringIO()):
+        if run == "relaunch":
+          pipeline(csv_dir, workbook)
+        else:
+          #the watch mode keeps its DataParse and SheetAPI around between statements
+          sheet_api.execute(dataparse.add_statements([os.path.join(csv_dir, f"new_{run}.csv")]))
+      elapsed = perf_counter() - start
+      print(f"  {run:>8}: {elapsed:7.2f}s from statement to workbook, {sum(workbook.calls.values()):>3} calls, {workbook.cells_read:,} cells read, {workbook.cells_written:,} written")
+
+def reconcile(args):
+  """Time to match transfers between accounts on synthetic multi-account histories of growing length, and how many of the
+  planted transfers were found"""
+  import numpy as np
+  import pandas as pd
+  from reconcile import match_transfers
+
+  generator = np.random.default_rng(0)
+  sources = np.array([f"account{i}" for i in range(args.accounts)], dtype=object)
+  print(f"{args.accounts} accounts, {args.rows} transactions per account and {args.transfers} transfers per month, {args.days} day window")
+  for years in args.years:
+    #everyday spending plus the odd refund or deposit in every account
+    count = years * 12 * args.accounts * args.rows
+    dates = np.datetime64("2000-01-01") + generator.integers(0, years * 365, count).astype("timedelta64[D]")
+    amounts = generator.integers(100, 20000, count) * np.where(generator.random(count) < 0.1, -1, 1)
+    df = pd.DataFrame({"Date": dates, "Description": "PURCHASE", "Amount": amounts, "Source": sources[generator.integers(0, args.accounts, count)]})
+
+    #and a few payments a month between accounts, posted up to `days` days apart
+    planted = years * 12 * args.transfers
+    paid = np.datetime64("2000-01-01") + generator.integers(0, years * 365, planted).astype("timedelta64[D]")
+    amount = generator.integers(1000, 500000, planted)
+    sender = generator.integers(0, args.accounts, planted)
+    receiver = (sender + generator.integers(1, args.accounts, planted)) % args.accounts
+    transfers = pd.DataFrame({"Date": np.concatenate([paid, paid + generator.integers(0, args.days + 1, planted).astype("timedelta64[D]")]),
+                              "Description": "TRANSFER", "Amount": np.concatenate([amount, -amount]), "Source": np.concatenate([sources[sender], sources[receiver]])})
+
+    df = pd.concat([df, transfers], ignore_index=True)
+    df["Category"] = "UNK"
+    df = df.sort_values("Date", kind="stable").reset_index(drop=True)
+
+    start = perf_counter()
+    pairs = match_transfers(df, args.days)
+    elapsed = perf_counter() - start
+    found = (df["Description"].to_numpy()[pairs] == "TRANSFER").all(axis=1).sum()
+    print(f"  {years:>3} year(s), {len(df):>9,} transactions: {elapsed:6.2f}s ({len(df) / elapsed:>10,.0f} rows/s), "
+          f"{len(pairs):,} pairs matched, {found:,} of {planted:,} planted transfers")
+
+def memory(args):
+  """Bytes per transaction of transaction_df with plain string and float columns versus the dictionary encoded layout"""
+  import numpy as np
+  import pandas as pd
+  from data_parse import compact_transactions
+
+  #a few accounts' worth of merchants, each with a number of store locations like real statements have
+  merchants = ["AMZN MKTP US*", "SUNOCO ", "WEGMANS #", "NETFLIX.COM", "SHELL OIL ", "TARGET T-", "STARBUCKS STORE ", "PAYROLL ACME"]
+  descriptions = np.array([f"{merchant}{store}" for merchant in merchants for store in range(args.stores)], dtype=object)
+  categories = np.array(["Housing", "Car", "Food", "Media", "Personal", "Travel", "Gift", "Misc", "UNK"], dtype=object)
+  generator = np.random.default_rng(0)
+  count = args.years * 12 * args.accounts * args.rows
+  dates = np.sort(np.datetime64("2015-01-01") + generator.integers(0, args.years * 365, count).astype("timedelta64[D]"))
+
+  before = pd.DataFrame({"Date": dates, "Description": descriptions[generator.integers(0, len(descriptions), count)],
+                         "Amount": generator.integers(100, 200000, count) / 100, "Category": categories[generator.integers(0, len(categories), count)]})
+  #the old layout held every description and category as its own Python string
+  before = before.astype({"Description": object, "Category": object})
+  after = compact_transactions(before.assign(Amount=(before["Amount"] * 100).round().astype("int64")))
+
+  print(f"{args.years} years, {args.accounts} accounts, {count:,} transactions, {len(descriptions):,} distinct descriptions")
+  for name, df in [("strings", before), ("categorical", after)]:
+    usage = df.memory_usage(deep=True, index=False)
+    columns = ", ".join(f"{column} {usage[column] / count:.1f}" for column in df.columns)
+    print(f"  {name:>12}: {usage.sum() / count:7.1f} bytes per transaction ({columns})")
+
+def suggest(args):
+  """Time to propose bulk categorization rules for a fresh import where nothing is categorized yet"""
+  import pandas as pd
+  from categorize_session import CategorizeSession
+
+  merchants = ["AMZN MKTP US*{ref}", "SUNOCO {store}", "WEGMANS #{store}", "NETFLIX.COM", "SHELL OIL {store}{ref}", "TARGET T-{store}",
+               "SQ *BLUE BOTTLE {date}", "PAYROLL ACME {ref}", "CITY OF PITTSBURGH {date} REF {ref}", "VENMO *{ref}"]
+  merchants += [f"{''.join(random.choices('ABCDEFGHIJKLMNOPRSTUVWY', k=random.randint(4, 9)))} {random.choice(['CAFE', 'MARKET', 'LLC', 'SHOP'])} {{store}}" for _ in range(args.merchants)]
+  descriptions = [random.choice(merchants).format(store=random.randint(1, 400), ref=f"{random.getrandbits(24):06X}", date=f"{random.randint(1, 12):02d}/{random.randint(1, 28):02d}")
+                  for _ in range(args.rows)]
+  descriptions = pd.Series(descriptions, dtype="category")
+
+  start = perf_counter()
+  session = CategorizeSession(descriptions, pd.Series(["UNK"] * len(descriptions)))
+  suggestions = session.suggest(args.limit)
+  elapsed = perf_counter() - start
+
+  print(f"{args.rows:,} uncategorized rows, {len(session):,} distinct descriptions, suggestions in {elapsed:.2f}s")
+  for expense, rows, example in suggestions:
+    print(f"  {expense:<32}{rows:>8,} rows  (e.g. {example})")
+  print(f"  the top {len(suggestions)} rules cover {sum(i[1] for i in suggestions) / args.rows:.0%} of the rows")
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="PySheetsBudget benchmarks")
+  subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+  subparser = subparsers.add_parser("async_months", help=async_months.__doc__)
+  subparser.add_argument("--months", type=int, default=60)
+  subparser.add_argument("--rows", type=int, default=150)
+  subparser.add_argument("--latency", type=float, default=0.1, help="seconds per request")
+  subparser.add_argument("--concurrency", type=int, default=8)
+  subparser.set_defaults(func=async_months)
+
+  subparser = subparsers.add_parser("parsers", help=parsers.__doc__)
+  subparser.add_argument("--rows", type=int, default=200000)
+  subparser.add_argument("--repeat", type=int, default=3)
+  subparser.set_defaults(func=parsers)
+
+  subparser = subparsers.add_parser("watch", help=watch.__doc__)
+  subparser.add_argument("--years", type=int, default=10)
+  subparser.add_argument("--rows", type=int, default=150, help="transactions per month")
+  subparser.add_argument("--latency", type=float, default=0.05, help="seconds per call")
+  subparser.set_defaults(func=watch)
+
+  subparser = subparsers.add_parser("reconcile", help=reconcile.__doc__)
+  subparser.add_argument("--years", type=int, nargs="+", default=[1, 5, 20, 50])
+  subparser.add_argument("--accounts", type=int, default=4)
+  subparser.add_argument("--rows", type=int, default=200, help="transactions per account per month")
+  subparser.add_argument("--transfers", type=int, default=4, help="transfers between accounts per month")
+  subparser.add_argument("--days", type=int, default=3, help="matching window")
+  subparser.set_defaults(func=reconcile)
+
+  subparser = subparsers.add_parser("memory", help=memory.__doc__)
+  subparser.add_argument("--years", type=int, default=10)
+  subparser.add_argument("--accounts", type=int, default=4)
+  subparser.add_argument("--rows", type=int, default=100, help="transactions per account per month")
+  subparser.add_argument("--stores", type=int, default=25, help="locations per merchant")
+  subparser.set_defaults(func=memory)
+
+  subparser = subparsers.add_parser("suggest", help=suggest.__doc__)
+  subparser.add_argument("--rows", type=int, default=100000)
+  subparser.add_argument("--merchants", type=int, default=200, help="extra small merchants in the long tail")
+  subparser.add_argument("--limit", type=int, default=15)
+  subparser.set_defaults(func=suggest)
+
+  subparser = subparsers.add_parser("sync", help=sync.__doc__)
+  subparser.add_argument("--years", type=int, nargs="+", default=[1, 5, 20])
+  subparser.add_argument("--rows", type=int, default=150, help="transactions per month")
+  subparser.add_argument("--latency", type=float, default=0, help="seconds per call")
+  subparser.add_argument("--summary", choices=["formulas", "values"], default="formulas")
+  subparser.set_defaults(func=sync)
+
+  args = parser.parse_args()
+  random.seed(0)
+  args.func(args)
@@ -0,0 +1,59 @@
+import heapq
+import numpy as np
+import pandas as pd
+from rule_suggestions import suggest_rules
+
+# %%
+
+class CategorizeSession:
+  """Uncategorized transactions indexed by description for the interactive expense:category prompt.
+  Each distinct description maps to the row positions that carry it, so a rule only scans the remaining distinct
+  descriptions and only touches the rows it matches. Every applied rule is kept in a small delta log for undo"""
+  def __init__(self, descriptions, categories):
+    codes, uniques = pd.factorize(descriptions)
+    self.descriptions = list(uniques)
+    self.lowered = [i.lower() for i in self.descriptions]
+
+    #inverted index: description code -> positions of the rows with that description
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    self.rows = [order[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    #remaining descriptions and how many rows carry each, the counts table the prompt shows
+    self.counts = {code: len(rows) for code, rows in enumerate(self.rows)}
+    self.categories = categories.to_numpy(dtype=object, copy=True)
+    self.log = []
+
+  def __len__(self):
+    return len(self.counts)
+
+  def top(self, n=50):
+    """The n most common remaining descriptions and their counts, like value_counts().head(n)"""
+    top = heapq.nlargest(n, self.counts.items(), key=lambda i: i[1])
+    return pd.DataFrame({"Count": [count for _, count in top]}, index=pd.Index([self.descriptions[code] for code, _ in top], name="Description"))
+
+  def suggest(self, n=10):
+    """Up to n (expense, rows, example) rules that would categorize the most remaining rows, see suggest_rules"""
+    codes = list(self.counts)
+    return suggest_rules([self.descriptions[code] for code in codes], [self.counts[code] for code in codes], n)
+
+  def apply(self, expense, category):
+    """Categorize every remaining description containing expense, returns the number of rows changed"""
+    matched = [code for code in self.counts if expense in self.lowered[code]]
+    if not matched:
+      return 0
+    rows = np.concatenate([self.rows[code] for code in matched])
+
+    #only the delta goes in the log: which descriptions left the table and what their rows were labelled before
+    self.log.append((expense, category, {code: self.counts.pop(code) for code in matched}, rows, self.categories[rows]))
+    self.categories[rows] = category
+    return len(rows)
+
+  def undo(self):
+    """Roll back the last applied rule, returns its (expense, category) or None when there's nothing left to undo"""
+    if not self.log:
+      return None
+    expense, category, counts, rows, previous = self.log.pop()
+    self.categories[rows] = previous
+    self.counts.update(counts)
+    return expense, category
@@ -0,0 +1,59 @@
+import re
+import json
+import hashlib
+import pandas as pd
+import numpy as np
+
+# %%
+
+def categories_hash(categories):
+  """Hash the category settings (order matters, the first matching rule wins)"""
+  return hashlib.sha1(json.dumps(categories).encode("utf-8")).hexdigest()
+
+class CategoryMatcher:
+  def __init__(self, categories):
+    #flatten the category rules into one priority ordered list, the first category/item pair to claim a substring keeps it
+    self.priority = {}
+    for category, items in categories.items():
+      for item in items:
+        if item not in self.priority:
+          self.priority[item] = (len(self.priority), category)
+
+    #one lookahead alternation tried at every position of the description. At each position the regex engine returns the
+    #highest priority item starting there, so the lowest priority over all positions is the first rule that would have matched
+    if self.priority:
+      self.pattern = re.compile("(?=(" + "|".join(re.escape(i) for i in self.priority) + "))")
+    else:
+      self.pattern = None
+
+  def match(self, description):
+    """Return the category of a single lowercase description, or "UNK" if no rule matches"""
+    if self.pattern is None:
+      return "UNK"
+    best = None
+    for hit in self.pattern.finditer(description):
+      rank = self.priority[hit.group(1)]
+      if best is None or rank[0] < best[0]:
+        best = rank
+        if best[0] == 0: break
+    return best[1] if best else "UNK"
+
+  def categorize(self, descriptions):
+    """Label a whole Description column in one call, each distinct description is only matched once"""
+    if isinstance(descriptions.dtype, pd.CategoricalDtype):
+      #already dictionary encoded, the categories are the distinct descriptions
+      codes, uniques = descriptions.cat.codes.to_numpy(), descriptions.cat.categories.str.lower()
+    else:
+      codes, uniques = pd.factorize(descriptions.str.lower())
+    #the trailing "UNK" catches the -1 code factorize gives missing descriptions
+    labels = np.array([self.match(i) for i in uniques] + ["UNK"], dtype=object)
+    return pd.Series(labels[codes], index=descriptions.index, dtype=object)
+
+#compiled matchers keyed on the category settings hash, so reloading or re-running with the same rules skips the compile
+_matchers = {}
+
+def get_matcher(categories):
+  key = categories_hash(categories)
+  if key not in _matchers:
+    _matchers[key] = CategoryMatcher(categories)
+  return _matchers[key]
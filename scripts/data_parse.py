@@ -1,160 +1,476 @@
-import os
-from glob import glob
-import pandas as pd
-from numpy import vectorize
-from io import StringIO
-import datetime as dt
-from dateutil.relativedelta import relativedelta
-
-# %%
-
-class DataParse:
-  def __init__(self):
-    self.transaction_df = None
-    self.settings = None
-  
-  def set_settings_file(self, settings):
-    self.settings = settings
-
-  def categorize(self, description, amount):
-    description = description.lower()
-    for category, items in self.settings["categories"].items():
-      for item in items:
-          if item in description: return (category, amount)
-    
-    return ("UNK", amount)
-
-  def __normalize_df(self, df):
-    #drop invalid rows
-    df = df.dropna()
-
-    #create cumulative count column to maintain local duplicates when global duplicates will be removed later
-    df["Count"] = df.groupby(["Date", "Description", "Amount"]).cumcount()
-
-    #converts amount column values to float and ignores zero cost items
-    if df["Amount"].dtype != "float64":
-      df["Amount"] = df["Amount"].str.replace(",", "")
-      df["Amount"] = pd.to_numeric(df["Amount"])
-    df = df[df["Amount"] != 0]
-
-    if self.settings and "categories" in self.settings:
-      #apply existing categories to purchases, if cannot be categorized, returns "UNK"  
-      df["Category"], df["Amount"] = vectorize(self.categorize)(df["Description"], df["Amount"])
-      #if credit card category and the number is negative, remove it from the dataframe (ignore credit card costs from bank statements, assumes that the credit card csv will also be provided)
-      df = df[df["Category"] != "Credit Card"]
-
-    #convert date column to datetime objects
-    df["Date"] = pd.to_datetime(df["Date"])
-
-    #if csv file has more negative numbers than positive, flip them (costs are positive)
-    negative_nums = df["Amount"].lt(0).sum()
-    positive_nums = df["Amount"].gt(0).sum()
-    if (negative_nums > positive_nums):
-      df["Amount"] = df["Amount"].apply(lambda x: x * -1)
-
-    return df
-
-  def get_transaction_df(self):
-    #grab all csv files in the current directory
-    print("Collecting .csv files...")
-    filedir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "csv_files")
-    csv_files = glob(os.path.join(filedir, "*.csv"))
-    if not csv_files:
-      input(f"No .csv files provided in {filedir}\nPress Enter to exit\n>> ")
-      exit()
-
-    df_bin = []
-    #iterate through each csv and scrape data
-    for file in csv_files:
-      with open(file, "r") as r:
-        content = r.readlines()
-      if content[0] == "Trans. Date,Post Date,Description,Amount,Category\n":
-        print("Compiling Discover card expenses...")
-        temp_df = self.__discover_parse(content)
-      elif content[0] == "Date,Description,Original Description,Category,Amount,Status\n":
-        print("Compiling USAA Bank expenses...")
-        temp_df = self.__usaa_parse(content)
-      elif "1," in content[0] and "/" in content[0]:
-        print("Compiling M&T Bank expenses...")
-        temp_df = self.__mtb_parse(content)
-      elif "Date,Description,Amount,Running Bal.\n" in content[:7]:
-        print("Compiling Bank of America expenses...")
-        temp_df = self.__boa_parse(content)
-      else:
-        print(f"Unrecognized CSV detected: {file}")
-        input("Press Enter to exit\n>> ")
-        exit()
-
-      #append temporary dataframe to df_bin for later concatenation
-      df_bin.append(temp_df)
-    
-    #remove global duplicate entries, sort the values by date, and do some cleanup
-    self.transaction_df = pd.concat(df_bin).drop_duplicates().sort_values(by="Date").reset_index(drop=True).drop(["Count"], axis=1)
-
-  def __boa_parse(self, content):
-    #iterate through BOA csv file until the header is found
-    for idx, line in enumerate(content):
-      if line == "Date,Description,Amount,Running Bal.\n":
-        break
-    content = content[idx:]
-    
-    temp_df = pd.read_csv(StringIO("".join(content)), header=0)
-    temp_df = temp_df.drop(columns="Running Bal.", axis=1)
-    temp_df = self.__normalize_df(temp_df.copy())
-
-    return temp_df
-
-  def __discover_parse(self, content):
-    temp_df = pd.read_csv(StringIO("".join(content)), header=0)
-    temp_df = temp_df.drop(columns="Post Date", axis=1)
-
-    #universalize the Date column
-    temp_df.rename(columns={"Trans. Date": "Date"}, inplace=True)
-
-    temp_df = self.__normalize_df(temp_df.copy())
-
-    return temp_df
-  
-  def __usaa_parse(self, content):
-    temp_df = pd.read_csv(StringIO("".join(content)), header=0)
-    temp_df = temp_df.drop(columns=["Original Description", "Status"], axis=1)
-    temp_df = self.__normalize_df(temp_df.copy())
-
-    return temp_df
-  
-  def __mtb_parse(self, content):
-    temp_df = pd.read_csv(StringIO("".join(content)), names=["Index", "Date", "Description", "Amount", "UNK", "Running Balance"])
-    temp_df.drop(columns=["Index", "UNK", "Running Balance"], axis=1)
-    temp_df = self.__normalize_df(temp_df.copy())
-
-  def get_mapped_df(self):
-    #find beginning and end dates for data sample
-    first_date = self.transaction_df["Date"].iloc[0]
-    last_date = self.transaction_df["Date"].iloc[-1]
-    first_date = dt.datetime(first_date.year, first_date.month, 1)
-    last_date = dt.datetime(last_date.year, last_date.month, 1) + relativedelta(months=1)
-
-    #sort dataframes by month and store in hashmap
-    date_map = {}
-    current_date = first_date
-    while (current_date < last_date):
-      date_tag = current_date.strftime("%b %Y")
-      temp_df = self.transaction_df[self.transaction_df["Date"] >= current_date]
-      temp_df = temp_df[temp_df["Date"] < current_date + relativedelta(months=1)]
-
-      temp_df["Date"] = temp_df["Date"].dt.strftime("%m/%d/%Y")
-      date_map[date_tag] = temp_df
-      current_date = current_date + relativedelta(months=1)
-    
-    self.date_map = date_map
-    self.first_date = first_date
-    self.last_date = last_date
-
-if __name__ == "__main__":
-  dataparse = DataParse()
-  dataparse.get_mapped_df()
-  transaction_df = dataparse.date_map
-
-  print()
-
-#TODO create first time setup, check for most frequently occurring items and save off categorization into json file
+import os
+import sys
+from glob import glob
+from itertools import repeat
+from collections.abc import Mapping
+from importlib.util import find_spec
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+import datetime as dt
+from dateutil.relativedelta import relativedelta
+from category_matcher import get_matcher, categories_hash
+from ingest_cache import IngestCache, file_sha1
+from transaction_store import TransactionStore
+import instrument
+from bank_formats import FORMATS, sniff
+from reconcile import match_transfers
+
+# %%
+
+def _current_rss_mb():
+  """Resident memory of this process in MB, None if the platform doesn't expose it"""
+  try:
+    import psutil
+    return psutil.Process().memory_info().rss / 1024**2
+  except ImportError:
+    pass
+  try:
+    with open("/proc/self/statm", "r") as r:
+      return int(r.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+  except (OSError, ValueError, AttributeError):
+    return None
+
+def _peak_rss_mb():
+  """Peak resident memory of this process in MB, None if the platform doesn't expose it"""
+  try:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #linux reports kilobytes, macOS reports bytes
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+  except ImportError:
+    pass
+  try:
+    import psutil
+    info = psutil.Process().memory_info()
+    return getattr(info, "peak_wset", info.rss) / 1024**2
+  except ImportError:
+    return None
+
+CSV_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "csv_files")
+
+#pyarrow's csv reader is used for whole-file reads whenever it's installed
+_HAS_PYARROW = find_spec("pyarrow") is not None
+
+def _arrow_read_csv(file, bank_format, skiprows):
+  """Read the mapped columns of a statement with pyarrow. Dates are kept as strings so __normalize_df parses every format
+  the same way, and empty cells come back as nulls like they do from pandas' own reader"""
+  from pyarrow import csv, string
+
+  if bank_format.names:
+    read_options = csv.ReadOptions(column_names=list(bank_format.names))
+  else:
+    read_options = csv.ReadOptions(skip_rows=skiprows)
+  date_column = next(key for key, value in bank_format.columns.items() if value == "Date")
+  convert_options = csv.ConvertOptions(include_columns=list(bank_format.columns), column_types={date_column: string()},
+                                       strings_can_be_null=True)
+  return csv.read_csv(file, read_options=read_options, convert_options=convert_options).to_pandas()
+
+def compact_transactions(df):
+  """Dictionary encode the Description, Category and Source columns. Descriptions repeat a lot (the same merchants every
+  month) and there are only a handful of categories and sources, so each row then holds a small integer code instead of a
+  Python string. Dates stay datetime64 and amounts integer cents"""
+  if "Category" not in df:
+    df["Category"] = "UNK"
+  df["Description"] = df["Description"].astype("category")
+  df["Category"] = df["Category"].astype("category")
+  if "Source" in df:
+    df["Source"] = df["Source"].astype("category")
+  return df
+
+#the columns of a parsed statement, in order
+STATEMENT_COLUMNS = ["Date", "Description", "Amount", "Category", "Count", "Source"]
+
+#the columns a month worksheet holds, in order
+SHEET_COLUMNS = ["Date", "Description", "Amount", "Category"]
+
+def _parse_statement(settings, file, bank, skiprows, chunksize, shrink_chunks_mb):
+  """Process pool entry point, parses a single statement with its own DataParse"""
+  dataparse = DataParse()
+  dataparse.set_settings_file(settings)
+  return dataparse.parse_file(file, bank, skiprows, chunksize, shrink_chunks_mb)
+
+class DataParse:
+  #bump whenever the normalized frame layout changes so old statement cache entries are dropped
+  schema_version = 6
+  default_chunksize = 50000
+  min_chunksize = 1000
+
+  def __init__(self, csv_dir=None, cache_dir=None, interactive=True):
+    self.transaction_df = None
+    self.settings = None
+    self.store = None
+    self.transfers = None
+
+    #several budgets can be parsed in one process, each from its own statements folder and optionally sharing one cache
+    self.csv_dir = csv_dir or CSV_DIR
+    self.cache_dir = cache_dir or os.path.join(self.csv_dir, ".cache")
+    #headless runs raise instead of waiting on someone to press Enter
+    self.interactive = interactive
+  
+  def set_settings_file(self, settings):
+    self.settings = settings
+
+  def categorize(self, descriptions):
+    """Label a Description column with the settings categories, anything unmatched is UNK"""
+    return get_matcher(self.settings["categories"]).categorize(descriptions)
+
+  def __setting(self, key, default=None):
+    if self.settings and key in self.settings:
+      return self.settings[key]
+    return default
+
+  @instrument.stage("normalize")
+  def __normalize_df(self, df, bank_format):
+    """Row-local cleanup, safe to run on any slice of a statement"""
+    #drop invalid rows
+    df = df.dropna()
+
+    #read_csv already strips thousands separators, anything still not numeric gets one vectorized cleanup pass
+    if not pd.api.types.is_numeric_dtype(df["Amount"]):
+      df["Amount"] = pd.to_numeric(df["Amount"].astype(str).str.replace(r"[$,]", "", regex=True))
+    #store amounts as integer cents and ignore zero cost items
+    df["Amount"] = (df["Amount"] * 100).round().astype("int64")
+    df = df[df["Amount"] != 0]
+
+    #convert date column to datetime objects with the bank's own format, only rows that don't fit it fall back to inference
+    dates = pd.to_datetime(df["Date"], format=bank_format.date_format, errors="coerce")
+    if dates.isna().any():
+      dates[dates.isna()] = pd.to_datetime(df["Date"][dates.isna()])
+    df["Date"] = dates
+
+    return df
+
+  def __finalize_df(self, df, bank_format):
+    """Whole-statement cleanup, needs every row of the file at once"""
+    #create cumulative count column to maintain local duplicates when global duplicates will be removed later
+    df["Count"] = df.groupby(["Date", "Description", "Amount"]).cumcount()
+
+    #costs are positive. Formats that don't declare their sign convention get flipped if the csv file has more negative
+    #numbers than positive
+    sign = bank_format.sign
+    if sign is None:
+      sign = -1 if df["Amount"].lt(0).sum() > df["Amount"].gt(0).sum() else 1
+    if sign < 0:
+      df["Amount"] = -df["Amount"]
+
+    #which account the row came from, transfers are only matched between different ones
+    df["Source"] = bank_format.name
+    return df
+
+  def __apply_categories(self, df):
+    """Label a parsed statement with the category rules. Statements are parsed and cached without them, so editing the
+    rules (or sharing a cache between budgets with different ones) never means parsing a statement again"""
+    if self.settings and "categories" in self.settings:
+      #apply existing categories to purchases, if cannot be categorized, returns "UNK". assign leaves the cached frame alone
+      df = df.assign(Category=self.categorize(df["Description"]))
+    return df[[i for i in STATEMENT_COLUMNS if i in df]]
+
+  def __drop_credit_card(self, df):
+    #ignore credit card costs from bank statements, assumes that the credit card csv will also be provided
+    if "Category" in df:
+      df = df[df["Category"] != "Credit Card"]
+    return df
+
+  @instrument.stage("reconcile")
+  def __reconcile(self, df):
+    """Flag (or drop, per the reconcile setting) the transfers between accounts the category rules didn't catch, e.g. a
+    card payment showing up as a bank debit and as a card credit. The matched rows are kept in self.transfers"""
+    mode = self.__setting("reconcile", "flag")
+    self.transfers = df.iloc[:0]
+    if not mode or "Source" not in df:
+      return df
+    pairs = match_transfers(df, self.__setting("reconcile_days", 3))
+    if not len(pairs):
+      return df
+
+    rows = pairs.ravel()
+    self.transfers = df.iloc[np.sort(rows)]
+    instrument.count("transfers_matched", len(pairs))
+    print(f"Matched {len(pairs)} transfer(s) between accounts...")
+    if mode == "drop":
+      keep = np.ones(len(df), dtype=bool)
+      keep[rows] = False
+      return df[keep].reset_index(drop=True)
+    category = (df["Category"].astype(object) if "Category" in df else pd.Series("UNK", index=df.index, dtype=object)).to_numpy(copy=True)
+    category[rows] = "Transfer"
+    df["Category"] = category
+    return df
+
+  def __fail(self, message):
+    if not self.interactive:
+      raise RuntimeError(message)
+    print(message)
+    input("Press Enter to exit\n>> ")
+    exit()
+
+  def __get_store(self):
+    """The transaction store in the statements folder, None if it's switched off"""
+    if not self.__setting("store", True):
+      return None
+    if self.store is None:
+      self.store = TransactionStore(os.path.join(self.csv_dir, "transactions.db"), self.schema_version)
+    return self.store
+
+  def __get_cache(self):
+    """The statement cache, None if it's switched off or parquet isn't available"""
+    if not self.__setting("cache", True):
+      return None
+    #cached statements aren't categorized yet, only the frame layout decides whether an entry is still good
+    fingerprint = f"v{self.schema_version}"
+    cache = IngestCache(self.cache_dir, fingerprint, self.__setting("cache_mb", 256))
+    return cache if cache.enabled else None
+
+  def __read_kwargs(self, bank_format, skiprows):
+    if bank_format.names:
+      read_kwargs = {"names": list(bank_format.names), "header": None}
+    else:
+      read_kwargs = {"skiprows": skiprows, "header": 0}
+    #only the columns the format maps are ever read
+    read_kwargs["usecols"] = list(bank_format.columns)
+    read_kwargs["thousands"] = ","
+    return read_kwargs
+
+  @instrument.stage("parse_file")
+  def parse_file(self, file, bank, skiprows, chunksize=None, shrink_chunks_mb=None):
+    """Read and normalize one statement. With a chunksize the raw csv is streamed instead of read whole, the normalized
+    rows of every chunk are still held until the whole statement is returned, so this bounds the raw read, not the result.
+    Over shrink_chunks_mb of memory the chunks that are still to come are read smaller"""
+    bank_format = FORMATS[bank]
+    print(f"Compiling {bank_format.label} expenses...")
+    read_kwargs = self.__read_kwargs(bank_format, skiprows)
+
+    if not chunksize:
+      #pyarrow's multithreaded csv reader when it's installed. It can't stream or strip thousands separators, __normalize_df
+      #takes care of the separators in one vectorized pass
+      if _HAS_PYARROW:
+        temp_df = _arrow_read_csv(file, bank_format, skiprows)
+      else:
+        temp_df = pd.read_csv(file, **read_kwargs)
+      return self.__finalize_df(self.__normalize_df(temp_df.rename(columns=bank_format.columns), bank_format), bank_format)
+
+    with open(file, "r") as r:
+      #stream the statement straight off the file handle, only the normalized columns of each chunk are kept
+      chunks = []
+      reader = pd.read_csv(r, chunksize=chunksize, **read_kwargs)
+      while True:
+        try:
+          chunk = reader.get_chunk(chunksize)
+        except StopIteration:
+          break
+        chunks.append(self.__normalize_df(chunk.rename(columns=bank_format.columns), bank_format))
+
+        #read smaller chunks while we're over the threshold. Only the raw chunk in flight shrinks, the rows parsed so far stay
+        rss = _current_rss_mb()
+        if shrink_chunks_mb and rss and rss > shrink_chunks_mb and chunksize > self.min_chunksize:
+          chunksize = max(chunksize // 2, self.min_chunksize)
+          print(f"Memory use over {shrink_chunks_mb} MB ({rss:.0f} MB), reading {chunksize} rows at a time")
+      reader.close()
+
+      #header-only statements don't produce any chunks
+      if not chunks:
+        r.seek(0)
+        chunks.append(self.__normalize_df(pd.read_csv(r, **read_kwargs).rename(columns=bank_format.columns), bank_format))
+
+    return self.__finalize_df(pd.concat(chunks), bank_format)
+
+  @instrument.stage("transactions")
+  def get_transaction_df(self, chunksize=None, shrink_chunks_mb=None, workers=None, files=None):
+    """Parse every statement in csv_files into transaction_df. Passing a chunksize (or shrink_chunks_mb) streams the files in
+    fixed size chunks and folds each file into a running deduplicated result instead of holding every raw statement at once.
+    Passing more than one worker parses the files in a process pool, the result is identical to the serial path.
+    `files` reads just those statements instead of every csv in the folder, see add_statements"""
+    chunksize = chunksize or self.__setting("chunksize")
+    #memory_limit_mb is the setting's old name, settings files written before the rename still use it
+    shrink_chunks_mb = shrink_chunks_mb or self.__setting("shrink_chunks_mb", self.__setting("memory_limit_mb"))
+    workers = workers or self.__setting("workers", 1)
+    if shrink_chunks_mb and not chunksize:
+      chunksize = self.default_chunksize
+
+    #grab all csv files in the current directory, sorted so the output doesn't depend on filesystem order
+    print("Collecting .csv files...")
+    filedir = self.csv_dir
+    csv_files = sorted(files if files is not None else glob(os.path.join(filedir, "*.csv")))
+    store = self.__get_store()
+    #with a transaction store the statements can be cleaned out once they're in it
+    if not csv_files and (store is None or not len(store)):
+      self.__fail(f"No .csv files provided in {filedir}")
+
+    #detect every format up front so an unrecognized file stops us before any parsing starts
+    formats = []
+    for file in csv_files:
+      bank_format, skiprows = sniff(file)
+      if bank_format is None:
+        self.__fail(f"Unrecognized CSV detected: {file}")
+      formats.append((bank_format.name, skiprows))
+
+    #statements that are already in the transaction store are never read again
+    cache = self.__get_cache()
+    hashes = [file_sha1(file) if store is not None or cache else None for file in csv_files]
+    if store is not None:
+      new = [idx for idx, file_hash in enumerate(hashes) if not store.has_file(file_hash)]
+      if len(new) < len(csv_files):
+        print(f"{len(csv_files) - len(new)} statement(s) already in the transaction store...")
+      csv_files, formats, hashes = [[i[idx] for idx in new] for i in (csv_files, formats, hashes)]
+
+    #statements that haven't changed since the last run come straight out of the cache
+    frames = [None] * len(csv_files)
+    keys = [None] * len(csv_files)
+    if cache:
+      for idx, (file_hash, (bank, skiprows)) in enumerate(zip(hashes, formats)):
+        keys[idx] = cache.key(file_hash, bank)
+        frames[idx] = cache.get(keys[idx])
+      instrument.count("statements_cached", cache.hits)
+      if cache.hits:
+        print(f"Loaded {cache.hits} unchanged statement(s) from the cache...")
+    todo = [idx for idx, frame in enumerate(frames) if frame is None]
+
+    #parse one file per task, executor.map hands the results back in file order
+    executor = None
+    if workers > 1 and len(todo) > 1:
+      executor = ProcessPoolExecutor(max_workers=min(workers, len(todo)))
+      parsed = executor.map(_parse_statement, repeat(self.settings), [csv_files[i] for i in todo], *zip(*[formats[i] for i in todo]), repeat(chunksize), repeat(shrink_chunks_mb))
+    else:
+      parsed = (self.parse_file(csv_files[i], *formats[i], chunksize, shrink_chunks_mb) for i in todo)
+    parsed = iter(parsed)
+
+    df_bin = []
+    seen_rows = np.empty(0, dtype="uint64")
+    #iterate through each parsed csv in file order
+    for idx, temp_df in enumerate(frames):
+      if temp_df is None:
+        temp_df = next(parsed)
+        instrument.count("statements_parsed")
+        instrument.count("rows_parsed", len(temp_df))
+        if cache:
+          cache.put(keys[idx], temp_df)
+      temp_df = self.__apply_categories(temp_df)
+
+      #the store does its own deduplication on insert
+      if store is not None:
+        store.add(temp_df, hashes[idx], os.path.basename(csv_files[idx]), formats[idx][0])
+        continue
+
+      if chunksize:
+        #fold the file into the running result, only rows we haven't seen in an earlier file are kept
+        row_hashes = pd.util.hash_pandas_object(temp_df, index=False).to_numpy()
+        keep = ~(pd.Series(row_hashes).duplicated().to_numpy() | np.isin(row_hashes, seen_rows))
+        seen_rows = np.concatenate([seen_rows, row_hashes[keep]])
+        temp_df = temp_df[keep]
+
+      #append temporary dataframe to df_bin for later concatenation
+      df_bin.append(temp_df)
+    
+    if store is not None:
+      #relabel the stored history if the category rules changed since it was written
+      if self.settings and "categories" in self.settings:
+        store.recategorize(categories_hash(self.settings["categories"]), self.categorize)
+      #add_statements merges the new rows into the transactions already in memory itself
+      if files is None or self.transaction_df is None:
+        self.transaction_df = compact_transactions(self.__reconcile(store.query()))
+    else:
+      #remove global duplicate entries (already done while folding when streaming), sort the values by date, and do some cleanup
+      transaction_df = self.__drop_credit_card(pd.concat(df_bin))
+      if not chunksize:
+        transaction_df = transaction_df.drop_duplicates()
+      transaction_df = transaction_df.sort_values(by="Date", kind="stable").reset_index(drop=True).drop(["Count"], axis=1)
+      self.transaction_df = compact_transactions(self.__reconcile(transaction_df))
+    if executor:
+      executor.shutdown()
+
+    peak = _peak_rss_mb()
+    if chunksize and peak:
+      print(f"Peak memory usage: {peak:.0f} MB")
+
+  def add_statements(self, files):
+    """Ingest just these statements, merge the rows the transaction store didn't already have into transaction_df and
+    return the months ("%b %Y") those rows fall in, along with the months of any earlier rows they turned out to be
+    transfers with. Nothing else is parsed or read back from the store"""
+    store = self.__get_store()
+    if store is None:
+      raise RuntimeError("Adding statements needs the transaction store, it's switched off in settings.conf")
+    if self.transaction_df is None:
+      self.get_transaction_df()
+    mark = store.last_row()
+    self.get_transaction_df(files=files)
+
+    added = store.query(after=mark)
+    if added.empty:
+      return set()
+    #the store orders by date and then insertion, a stable sort of old rows followed by new ones keeps that order
+    transaction_df = pd.concat([self.transaction_df.astype({"Description": object, "Category": object, "Source": object}), added], ignore_index=True)
+    #rows already flagged as transfers aren't uncategorized anymore, only pairs involving the new rows can turn up
+    transaction_df = self.__reconcile(transaction_df.sort_values(by="Date", kind="stable").reset_index(drop=True))
+    self.transaction_df = compact_transactions(transaction_df)
+    instrument.count("rows_added", len(added))
+    return set(added["Date"].dt.strftime("%b %Y")) | set(self.transfers["Date"].dt.strftime("%b %Y"))
+
+  def recategorize(self):
+    """Relabel every transaction with the current category rules, in memory and in the transaction store"""
+    self.transaction_df["Category"] = self.categorize(self.transaction_df["Description"])
+    self.transaction_df = compact_transactions(self.__reconcile(self.transaction_df))
+    if self.store is not None:
+      self.store.recategorize(categories_hash(self.settings["categories"]), self.categorize)
+
+  def category_counts(self):
+    """Transactions per category, most common first, counted straight off the category codes. Unlike value_counts on a
+    categorical column, categories nobody uses anymore are left out"""
+    category = self.transaction_df["Category"].cat
+    codes = category.codes.to_numpy()
+    counts = pd.Series(np.bincount(codes[codes >= 0], minlength=len(category.categories)), index=category.categories.astype(object))
+    return counts[counts > 0].sort_values(ascending=False, kind="stable")
+
+  def query(self, start=None, end=None, category=None, description=None):
+    """Indexed lookup of stored transactions dated in [start, end), e.g. query("2023-01-01", "2024-01-01", "Food")"""
+    store = self.__get_store()
+    if store is None:
+      raise RuntimeError("The transaction store is switched off in settings.conf")
+    return store.query(start, end, category, description)
+
+  @instrument.stage("map_months")
+  def get_mapped_df(self):
+    #find beginning and end dates for data sample
+    first_date = self.transaction_df["Date"].iloc[0]
+    last_date = self.transaction_df["Date"].iloc[-1]
+    first_date = dt.datetime(first_date.year, first_date.month, 1)
+    last_date = dt.datetime(last_date.year, last_date.month, 1) + relativedelta(months=1)
+
+    #sort dataframes by month and store in a lazy hashmap
+    self.date_map = MonthMap(self.transaction_df, first_date, last_date)
+    self.first_date = first_date
+    self.last_date = last_date
+
+class MonthMap(Mapping):
+  """Month tag ("%b %Y") to month dataframe map. The month boundaries are found in one pass over the date sorted
+  transactions, a month's frame is only sliced out and date formatted when it's looked up"""
+  def __init__(self, transaction_df, first_date, last_date):
+    self.transaction_df = transaction_df
+    month_starts = pd.date_range(first_date, last_date, freq="MS")
+    bounds = np.searchsorted(transaction_df["Date"].to_numpy(), month_starts.to_numpy())
+    #every month in the range keeps its key, even the ones without any transactions
+    self.slices = {tag: (start, stop) for tag, start, stop in zip(month_starts[:-1].strftime("%b %Y"), bounds[:-1], bounds[1:])}
+
+  def __getitem__(self, month):
+    start, stop = self.slices[month]
+    temp_df = self.transaction_df.iloc[start:stop][SHEET_COLUMNS].copy()
+    temp_df["Date"] = temp_df["Date"].dt.strftime("%m/%d/%Y")
+    #amounts are kept in integer cents, the worksheets want dollars
+    temp_df["Amount"] = temp_df["Amount"] / 100
+    return temp_df
+
+  def is_empty(self, month):
+    start, stop = self.slices[month]
+    return start == stop
+
+  def __iter__(self):
+    return iter(self.slices)
+
+  def __len__(self):
+    return len(self.slices)
+
+if __name__ == "__main__":
+  dataparse = DataParse()
+  dataparse.get_mapped_df()
+  transaction_df = dataparse.date_map
+
+  print()
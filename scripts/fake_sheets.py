@@ -0,0 +1,163 @@
+import re
+import copy
+import asyncio
+from time import sleep
+
+# %%
+
+def _column(letters):
+  number = 0
+  for letter in letters:
+    number = number * 26 + ord(letter) - 64
+  return number - 1
+
+def parse_a1(cell_range):
+  """Split an A1 range like 'Jan 2024'!A2:D1000 into (title, first row, first column, last row, last column), zero based"""
+  match = re.match(r"^'((?:[^']|'')*)'!([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$", cell_range)
+  title = match.group(1).replace("''", "'")
+  first_column = _column(match.group(2))
+  first_row = int(match.group(3)) - 1 if match.group(3) else 0
+  last_column = _column(match.group(4)) if match.group(4) else first_column
+  last_row = int(match.group(5)) - 1 if match.group(5) else 10**6
+  return title, first_row, first_column, last_row, last_column
+
+class FakeWorkbook:
+  """In-memory stand-in for a Google Sheets workbook, speaking the same request bodies as the real API. Any object with
+  fetch_sheet_metadata, batch_update, values_batch_update and values_batch_get can be handed to SheetAPI as its backend.
+  Every call is counted along with the cells it read or wrote, and takes `latency` seconds like a round trip would"""
+  def __init__(self, latency=0):
+    self.sheets = {}
+    self.latency = latency
+    self.reset_counters()
+
+  def reset_counters(self):
+    self.calls = {}
+    self.cells_read = 0
+    self.cells_written = 0
+    self.simulated = 0
+
+  def __record(self, operation):
+    self.calls[operation] = self.calls.get(operation, 0) + 1
+    if self.latency:
+      sleep(self.latency)
+      self.simulated += self.latency
+
+  def add_sheet(self, sheet_id, title, hidden=False, cells=None):
+    self.sheets[sheet_id] = {"properties": {"sheetId": sheet_id, "title": title, "index": len(self.sheets), "hidden": hidden}, "cells": cells or {}}
+
+  def sheet(self, title):
+    for sheet in self.sheets.values():
+      if sheet["properties"]["title"] == title:
+        return sheet
+    raise KeyError(title)
+
+  def fetch_sheet_metadata(self, params=None):
+    self.__record("fetch_sheet_metadata")
+    ordered = sorted(self.sheets.values(), key=lambda i: i["properties"]["index"])
+    return {"sheets": [{"properties": dict(i["properties"])} for i in ordered]}
+
+  def batch_update(self, body):
+    self.__record("batch_update")
+    for request in body["requests"]:
+      (kind, args), = request.items()
+      if kind == "duplicateSheet":
+        source = self.sheets[args["sourceSheetId"]]
+        if any(i["properties"]["title"] == args["newSheetName"] for i in self.sheets.values()):
+          raise ValueError(f"A sheet with the name \"{args['newSheetName']}\" already exists")
+        self.add_sheet(args["newSheetId"], args["newSheetName"], source["properties"]["hidden"], copy.deepcopy(source["cells"]))
+      elif kind == "updateSheetProperties":
+        sheet = self.sheets[args["properties"]["sheetId"]]
+        for field in args["fields"].split(","):
+          if field == "index":
+            ordered = sorted(self.sheets.values(), key=lambda i: i["properties"]["index"])
+            ordered.remove(sheet)
+            ordered.insert(args["properties"]["index"], sheet)
+            for idx, i in enumerate(ordered):
+              i["properties"]["index"] = idx
+          else:
+            sheet["properties"][field] = args["properties"][field]
+      elif kind == "deleteSheet":
+        del self.sheets[args["sheetId"]]
+      else:
+        raise ValueError(f"Unsupported request {kind}")
+    return {"replies": [{} for _ in body["requests"]]}
+
+  def values_update(self, cell_range, values):
+    self.__record("values_update")
+    return self.__write(cell_range, values)
+
+  def __write(self, cell_range, values):
+    title, first_row, first_column, _, _ = parse_a1(cell_range)
+    cells = self.sheet(title)["cells"]
+    for row_idx, row in enumerate(values):
+      for column_idx, value in enumerate(row):
+        cells[(first_row + row_idx, first_column + column_idx)] = value
+    written = sum(len(row) for row in values)
+    self.cells_written += written
+    return written
+
+  def values_batch_update(self, body):
+    self.__record("values_batch_update")
+    for data in body["data"]:
+      self.__write(data["range"], data["values"])
+    return {}
+
+  def values_get(self, cell_range, params=None):
+    self.__record("values_get")
+    return self.__read(cell_range, params)
+
+  def __read(self, cell_range, params):
+    params = params or {}
+    title, first_row, first_column, last_row, last_column = parse_a1(cell_range)
+    rows = {}
+    for (row, column), value in self.sheet(title)["cells"].items():
+      if first_row <= row <= last_row and first_column <= column <= last_column and value != "":
+        rows.setdefault(row, {})[column] = value
+    if not rows:
+      return {"range": cell_range}
+
+    #like the real API, trailing empty rows and cells are left off
+    grid = []
+    for row in range(first_row, max(rows) + 1):
+      cells = rows.get(row, {})
+      width = max(cells) + 1 if cells else first_column
+      grid.append([self.__render(cells.get(column, ""), params) for column in range(first_column, width)])
+    if params.get("majorDimension") == "COLUMNS":
+      width = max(len(i) for i in grid)
+      grid = [[row[column] if column < len(row) else "" for row in grid] for column in range(width)]
+    self.cells_read += sum(len(row) for row in grid)
+    return {"range": cell_range, "values": grid}
+
+  def values_batch_get(self, ranges, params=None):
+    self.__record("values_batch_get")
+    return {"valueRanges": [self.__read(i, params) for i in ranges]}
+
+  def __render(self, value, params):
+    if params.get("valueRenderOption") == "FORMULA" or isinstance(value, str):
+      return value
+    return str(value)
+
+async def serve(workbook, sheet_id, latency=0, host="127.0.0.1", port=0):
+  """Serve a FakeWorkbook over the parts of the Sheets REST API that AsyncSheets uses, each request takes `latency` seconds.
+  Returns the aiohttp runner and the base url to hand to AsyncSheets"""
+  from aiohttp import web
+
+  async def batch_update(request):
+    await asyncio.sleep(latency)
+    return web.json_response(workbook.batch_update(await request.json()))
+
+  async def values_update(request):
+    await asyncio.sleep(latency)
+    body = await request.json()
+    updated = workbook.values_update(request.match_info["range"], body["values"])
+    return web.json_response({"updatedRange": request.match_info["range"], "updatedCells": updated})
+
+  app = web.Application()
+  app.router.add_post(f"/v4/spreadsheets/{sheet_id}:batchUpdate", batch_update)
+  app.router.add_put(f"/v4/spreadsheets/{sheet_id}/values/{{range}}", values_update)
+  runner = web.AppRunner(app)
+  await runner.setup()
+  site = web.TCPSite(runner, host, port)
+  await site.start()
+  port = runner.addresses[0][1]
+  return runner, f"http://{host}:{port}/v4/spreadsheets"
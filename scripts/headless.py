@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import argparse
+import traceback
+from time import sleep, perf_counter
+from data_parse import DataParse
+import instrument
+
+# %%
+
+def uncategorized_report(transaction_df, path):
+  """Write every description the category rules don't cover to a csv, most common first. Returns how many there are"""
+  if "Category" not in transaction_df:
+    transaction_df["Category"] = "UNK"
+  unknown = transaction_df[transaction_df["Category"].isna() | (transaction_df["Category"] == "UNK")]
+  report = unknown.groupby("Description", observed=True).agg(Count=("Amount", "size"), Total=("Amount", "sum"), First=("Date", "min"), Last=("Date", "max"))
+  #amounts are kept in integer cents
+  report["Total"] = report["Total"] / 100
+  report.sort_values("Count", ascending=False, kind="stable").to_csv(path, date_format="%m/%d/%Y")
+  return len(report)
+
+class Headless:
+  """Runs budgets without a terminal: no prompts, no screen clearing, failures raise. Budgets are synced one after another
+  with a single authorized gspread client, and statements parsed for one budget are reused from memory by the next"""
+  def __init__(self, mode="sync", credentials_file=None, cache_dir=None, uncategorized_dir=None, attempts=3):
+    self.mode = mode
+    self.credentials_file = credentials_file
+    self.cache_dir = cache_dir
+    self.uncategorized_dir = uncategorized_dir
+    self.attempts = attempts
+    self.creds = None
+    self.client = None
+
+  def __authorize(self):
+    if self.client is None:
+      #only sync mode needs the Sheets client, report mode never loads it
+      import gspread
+      from sheet_api import load_credentials
+      self.creds = load_credentials(self.credentials_file)
+      self.client = gspread.authorize(self.creds)
+
+  def __load(self, settings_file, sheet_id, csv_dir):
+    with open(settings_file, "r") as r:
+      settings = json.load(r)
+    sheet_id = sheet_id or settings.get("sheet_id")
+    csv_dir = csv_dir or settings.get("csv_dir")
+
+    dataparse = DataParse(csv_dir, self.cache_dir, interactive=False)
+    dataparse.set_settings_file(settings)
+    dataparse.get_transaction_df()
+    return settings, sheet_id, dataparse
+
+  def __report(self, settings_file, sheet_id, dataparse):
+    #unknown transactions are left for someone to categorize later instead of stopping the run at a prompt
+    report_dir = self.uncategorized_dir or os.path.dirname(os.path.abspath(settings_file))
+    report_file = os.path.join(report_dir, f"uncategorized_{sheet_id or 'budget'}.csv")
+    unknown = uncategorized_report(dataparse.transaction_df, report_file)
+    instrument.count("uncategorized_descriptions", unknown)
+    print(f"{unknown} uncategorized descriptions written to {report_file}")
+
+  def __sheet_api(self, settings_file, settings, sheet_id, dataparse):
+    if not sheet_id:
+      raise ValueError(f"No sheet id given for {settings_file}")
+    from sheet_api import SheetAPI
+    self.__authorize()
+    return SheetAPI(sheet_id, dataparse, engine=settings.get("engine", "batch"), concurrency=settings.get("concurrency", 8),
+                    summary=settings.get("summary", "formulas"), creds=self.creds, client=self.client, interactive=False)
+
+  def __execute(self, sheet_api, months=None):
+    from gspread.exceptions import APIError
+    for attempt in range(self.attempts):
+      try:
+        sheet_api.execute(months)
+        return
+      except APIError:
+        #SheetAPI already backs off on quota errors, the checkpoint lets the next attempt skip what was written
+        if attempt == self.attempts - 1:
+          raise
+        print("Google's write request quota reached, waiting 1 minute before resuming...")
+        sleep(60)
+
+  def run(self, settings_file, sheet_id=None, csv_dir=None):
+    settings, sheet_id, dataparse = self.__load(settings_file, sheet_id, csv_dir)
+    self.__report(settings_file, sheet_id, dataparse)
+    if self.mode != "sync":
+      return
+    self.__execute(self.__sheet_api(settings_file, settings, sheet_id, dataparse))
+
+  def __add_statements(self, dataparse, watcher, files):
+    """Ingest a batch of statements and mark them seen. If the batch fails the statements are added one at a time, so an
+    unreadable or unrecognized export doesn't hold back the rest, and the ones that still fail are left for the watcher to
+    hand out again. A failed sync afterwards is retried through the pending months, the statements are in the store by then"""
+    try:
+      months = dataparse.add_statements(files)
+      watcher.mark_seen(files)
+      return months
+    except Exception:
+      if len(files) == 1:
+        raise
+    months = set()
+    for file in files:
+      try:
+        months |= dataparse.add_statements([file])
+        watcher.mark_seen([file])
+      except Exception:
+        traceback.print_exc()
+        instrument.count("watch_failures")
+    return months
+
+  def watch(self, settings_file, sheet_id=None, csv_dir=None, interval=1.0, debounce=2.0):
+    """Sync once, then keep watching the statements folder and push only the months that new statements touch (and their
+    years' summaries). The parsed history, the authorized client and the worksheet map stay in memory between syncs.
+    Runs until interrupted"""
+    from statement_watcher import StatementWatcher
+    settings, sheet_id, dataparse = self.__load(settings_file, sheet_id, csv_dir)
+    self.__report(settings_file, sheet_id, dataparse)
+    sheet_api = self.__sheet_api(settings_file, settings, sheet_id, dataparse)
+    self.__execute(sheet_api)
+
+    watcher = StatementWatcher(dataparse.csv_dir, interval, debounce)
+    #months whose sync failed are retried along with the next batch of statements
+    pending = set()
+    print(f"Watching {dataparse.csv_dir} for new statements, press Ctrl+C to stop")
+    while True:
+      files = watcher.wait()
+      start = perf_counter()
+      try:
+        with instrument.stage("watch_sync"):
+          months = self.__add_statements(dataparse, watcher, files)
+          if months:
+            self.__report(settings_file, sheet_id, dataparse)
+          pending |= months
+          if pending:
+            self.__execute(sheet_api, pending)
+            pending = set()
+      except Exception:
+        #a failed sync only costs this batch, watching goes on
+        traceback.print_exc()
+        instrument.count("watch_failures")
+        continue
+      instrument.count("watch_syncs")
+      print(f"{len(files)} statement(s), {len(months)} month(s) synced in {perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Run PySheetsBudget without prompts, e.g. from cron or a scheduled task")
+  parser.add_argument("--job", nargs="+", action="append", required=True, metavar="SETTINGS [SHEET_ID [CSV_DIR]]",
+                      help="a settings.conf, optionally followed by the sheet id and statements folder to use instead of the ones it names. Repeat for several budgets")
+  parser.add_argument("--mode", choices=["sync", "report", "watch"], default="sync",
+                      help="sync the Google Sheet, only parse and write the uncategorized report, or sync and then keep syncing new statements as they show up")
+  parser.add_argument("--interval", type=float, default=1.0, help="watch mode: seconds between looks at the statements folder")
+  parser.add_argument("--debounce", type=float, default=2.0, help="watch mode: seconds the folder has to be quiet before new statements are synced")
+  parser.add_argument("--credentials", metavar="FILE", help="service account credentials (default scripts/credentials.json)")
+  parser.add_argument("--cache-dir", metavar="DIR", help="statement cache folder shared by every job (default each statements folder's .cache)")
+  parser.add_argument("--uncategorized-dir", metavar="DIR", help="where the uncategorized reports go (default next to each settings file)")
+  parser.add_argument("--report", metavar="FILE", help="write a JSON report of stage timings and counters for the whole run")
+  args = parser.parse_args()
+
+  headless = Headless(args.mode, args.credentials, args.cache_dir, args.uncategorized_dir)
+  if args.mode == "watch":
+    if len(args.job) != 1 or len(args.job[0]) > 3:
+      parser.error("--mode watch takes a single --job")
+    try:
+      headless.watch(*args.job[0], interval=args.interval, debounce=args.debounce)
+    except KeyboardInterrupt:
+      print("Stopped watching")
+    finally:
+      if args.report:
+        instrument.write_report(args.report)
+    sys.exit(0)
+
+  failed = 0
+  for job in args.job:
+    if len(job) > 3:
+      parser.error(f"--job takes at most SETTINGS SHEET_ID CSV_DIR, got {' '.join(job)}")
+    #one budget failing doesn't stop the others
+    try:
+      with instrument.stage("job"):
+        headless.run(*job)
+    except Exception:
+      traceback.print_exc()
+      failed += 1
+  instrument.count("jobs_failed", failed)
+
+  if args.report:
+    instrument.write_report(args.report)
+  sys.exit(1 if failed else 0)
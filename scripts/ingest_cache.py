@@ -0,0 +1,89 @@
+import os
+import hashlib
+from glob import glob
+from importlib.util import find_spec
+import pandas as pd
+
+# %%
+
+def file_sha1(file):
+  sha = hashlib.sha1()
+  with open(file, "rb") as r:
+    for block in iter(lambda: r.read(1024**2), b""):
+      sha.update(block)
+  return sha.hexdigest()
+
+class IngestCache:
+  """On-disk cache of normalized statement dataframes, one parquet file per statement.
+  Entries are named {file hash}_{bank}_{fingerprint}.parquet, the fingerprint covers the frame layout, so editing a statement
+  or the normalization code misses the cache. Statements are cached before the category rules are applied, budgets with
+  different rules share entries. Entries read or written in this process are also kept in memory, so budgets synced one
+  after another in a headless run (or a long running watch) don't read them again. The in-memory copies are held to the
+  same size limit as the folder"""
+  #key -> (dataframe, bytes), least recently used first
+  memory = {}
+
+  def __init__(self, cache_dir, fingerprint, max_mb=256):
+    self.cache_dir = cache_dir
+    self.fingerprint = fingerprint
+    self.max_bytes = max_mb * 1024**2
+    self.hits = 0
+    self.misses = 0
+
+    #parquet needs pyarrow, without it we just parse everything like before
+    self.enabled = find_spec("pyarrow") is not None
+    if not self.enabled:
+      return
+
+    os.makedirs(self.cache_dir, exist_ok=True)
+    self.__invalidate()
+
+  def __entries(self):
+    return glob(os.path.join(self.cache_dir, "*.parquet"))
+
+  def __invalidate(self):
+    """Drop every entry made with a different fingerprint, they can never be hit again"""
+    for entry in self.__entries():
+      if not entry.endswith(f"_{self.fingerprint}.parquet"):
+        os.remove(entry)
+
+  def __evict(self):
+    """Remove the least recently used entries until the cache fits in max_mb"""
+    entries = sorted(self.__entries(), key=os.path.getmtime)
+    total = sum(os.path.getsize(i) for i in entries)
+    while entries and total > self.max_bytes:
+      entry = entries.pop(0)
+      total -= os.path.getsize(entry)
+      os.remove(entry)
+
+  def __remember(self, key, df):
+    self.memory.pop(key, None)
+    self.memory[key] = (df, int(df.memory_usage(deep=True, index=False).sum()))
+    total = sum(size for _, size in self.memory.values())
+    while self.memory and total > self.max_bytes:
+      total -= self.memory.pop(next(iter(self.memory)))[1]
+
+  def key(self, file_hash, bank):
+    return f"{file_hash}_{bank}_{self.fingerprint}"
+
+  def get(self, key):
+    if key in self.memory:
+      self.hits += 1
+      #move it to the back of the line for eviction
+      self.memory[key] = self.memory.pop(key)
+      return self.memory[key][0]
+    path = os.path.join(self.cache_dir, f"{key}.parquet")
+    if not os.path.exists(path):
+      self.misses += 1
+      return None
+    #touch the entry so eviction sees it as recently used
+    os.utime(path)
+    self.hits += 1
+    df = pd.read_parquet(path)
+    self.__remember(key, df)
+    return df
+
+  def put(self, key, df):
+    self.__remember(key, df)
+    df.to_parquet(os.path.join(self.cache_dir, f"{key}.parquet"), index=False)
+    self.__evict()
@@ -0,0 +1,53 @@
+import json
+import platform
+import datetime as dt
+from time import perf_counter
+from contextlib import contextmanager
+
+# %%
+
+#per-stage wall time and entry count, and plain counters (rows parsed, API calls, cells written...) for this process.
+#Statements parsed in a worker pool only report their totals back, their stage timings stay in the workers
+_stages = {}
+_counters = {}
+_started = dt.datetime.now()
+_start = perf_counter()
+
+def reset():
+  global _started, _start
+  _stages.clear()
+  _counters.clear()
+  _started = dt.datetime.now()
+  _start = perf_counter()
+
+def record(name, seconds):
+  """Add time measured elsewhere (e.g. quota sleeps) to a stage"""
+  stage = _stages.setdefault(name, {"seconds": 0, "calls": 0})
+  stage["seconds"] += seconds
+  stage["calls"] += 1
+
+@contextmanager
+def stage(name):
+  """Time a block of the pipeline, nested and repeated stages add up independently"""
+  start = perf_counter()
+  try:
+    yield
+  finally:
+    record(name, perf_counter() - start)
+
+def count(name, amount=1):
+  _counters[name] = _counters.get(name, 0) + amount
+
+def report():
+  return {
+    "started": _started.isoformat(timespec="seconds"),
+    "elapsed": round(perf_counter() - _start, 4),
+    "python": platform.python_version(),
+    "stages": {name: {"seconds": round(i["seconds"], 4), "calls": i["calls"]} for name, i in sorted(_stages.items())},
+    "counters": dict(sorted(_counters.items())),
+  }
+
+def write_report(path):
+  """Write the run report as JSON, stable keys so successive reports can be diffed"""
+  with open(path, "w") as w:
+    json.dump(report(), w, indent=1)
@@ -1,249 +1,341 @@
-from data_parse import DataParse
-from sheet_api import SheetAPI
-from gspread.exceptions import APIError
-import json
-from numpy import vectorize
-import os
-from glob import glob
-from time import sleep
-
-# %%
-
-class CLI:
-  def __init__(self):
-    self.splash = r"""
-     ____          _          _  _  _  _   
-    |  _ \        | |        | |(_)(_)| |  
-    | |_) | _   _ | |__    __| | _  _ | |_ 
-    |  _ < | | | || '_ \  / _` || || || __|
-    | |_) || |_| || | | || (_| || || || |_ 
-    |____/  \__,_||_| |_| \__,_|| ||_| \__|
-                               _/ |        
-                              |__/         """
-    self.categories = ["Housing", "Car", "Food", "Media", "Personal", "Travel", "Gift", "Misc", "Credit"]
-
-    self.clear_str = None
-    self.__get_os_clear_str()
-
-    self.DataParse = DataParse()
-
-    self.settings_file = None
-    self.settings = {}
-    self.__get_settings()
-    if not self.settings:
-      self.__first_time_setup()
-
-    self.DataParse.get_transaction_df()
-    sleep(1)
-
-    self.__title()
-
-    self.SheetAPI = SheetAPI(self.settings["sheet_id"], self.DataParse)
-    while True:
-      try:
-        self.SheetAPI.execute()
-        break
-      except APIError:
-        print("Google's write request quota reached, waiting 1 minute before proceeding...")
-        sleep(60)
-    print("Done! Please Venmo Dan $5 for running the script")
-    sleep(2)
-    exit()
-
-
-  def __get_os_clear_str(self):
-    if os.name == "nt":
-      self.clear_str = "cls"
-    else:
-      self.clear_str = "clear"
-
-  def __get_settings(self):
-    filedir = os.path.dirname(os.path.abspath(__file__))
-    self.settings_file = os.path.join(filedir, "settings.conf")
-    files = glob(os.path.join(filedir, "*"))
-    for file in files:
-      if "settings.conf" in file:
-        try:
-          with open(file, "r") as r:
-            self.settings = json.load(r)
-        except:
-          print("ERROR: Invalid settings.conf formatting detected. Please exit the script and attempt to repair or press Enter to begin first time setup.")
-          input(">> ")
-          return
-        self.settings_file = file
-        self.DataParse.set_settings_file(self.settings)
-        break
-    
-
-  def __write_settings(self):
-    with open(self.settings_file, "w") as w:
-      json.dump(self.settings, w, indent=1)
-
-  def __reinitialize_category_df(self):
-    for category in self.categories:
-      self.uncat_df = self.uncat_df[self.uncat_df["Category"] != category]
-    self.df_set = self.uncat_df["Description"].value_counts().to_frame("Count")
-
-  def __categorize_df(self, description, orig_category):
-    description = description.lower()
-    if self.expense in description:
-      self.log_bin.append(description)
-      return self.category.capitalize()
-    
-    return orig_category
-    
-  def __category_option(self):
-    os.system(self.clear_str)
-
-    if "categories" not in self.settings:
-      category_dict = {key : [] for key in self.categories}
-    else:
-      category_dict = self.settings["categories"]
-
-    self.uncat_df = self.DataParse.transaction_df.copy()
-    for category in self.categories + ["Paycheck"]:
-      self.uncat_df = self.uncat_df[self.uncat_df["Category"] != category]
-    self.rollback_df = self.uncat_df.copy()
-
-    self.df_set = self.uncat_df["Description"].value_counts().to_frame("Count")
-
-    input_count = 0
-    last_category = ""
-    undone = False
-    rows_changed = None
-    set_size = self.df_set.shape[0]
-    while set_size > 0:
-      os.system(self.clear_str)
-      print(self.df_set.head(50).to_string(header=False))
-      print(f"\nPlease sort the above expenses in the following categories:\n\t{', '.join(self.categories)}\nIf the expense is a Credit Card payment or deposit, please categorize it as Credit.\nFor example:\n\tamzn : personal\n\tsunoco: car\n\tdiscover des :credit\n")
-      if set_size < 100 or input_count >= 20:
-        print("When you're satisfied with the sorting, input \"exit\"\n")
-      if rows_changed != None:
-        print(f"{rows_changed} expenses categorized")
-
-      user_input = input()
-
-      if user_input.strip().lower() in ["exit", "quit", "0"]:
-        os.system(self.clear_str)
-        break
-
-      if user_input.strip().lower() in ["undo", "back", "rollback"]:
-        if undone:
-          input("Only one undo operation is available. Press Enter to continue\n")
-          continue
-        if not last_category:
-          input("There's nothing to undo you dingus. Press Enter to continue\n")
-          continue
-        input_count -= 1
-        undone = True
-        self.uncat_df = self.rollback_df.copy()
-        category_dict[last_category].pop()
-        self.__reinitialize_category_df()
-        continue
-      else:
-        undone = False
-      
-      if ":" not in user_input:
-        input("Invalid input. Please follow the format of {EXPENSE}:{CATEGORY}. Press Enter to continue\n")
-        continue
-      
-      self.rollback_df = self.uncat_df.copy()
-      expense, category = [i.strip() for i in user_input.split(":")]
-      category = category.capitalize()
-      expense = expense.lower()
-      self.category = category
-      self.expense = expense
-
-      if not expense:
-        input("Invalid input. Please follow the format of {EXPENSE}:{CATEGORY}. Press Enter to continue\n")
-        continue
-      if category.capitalize() not in self.categories:
-        input(f"Invalid category. Please only select from: {', '.join(self.categories)}. Press Enter to continue\n")
-        continue
-
-      self.log_bin = []
-      self.rollback_df["Category"] = vectorize(self.__categorize_df)(self.uncat_df["Description"], self.uncat_df["Category"])
-      rows_changed = len(self.log_bin)
-      if rows_changed > 0:
-        input_count += 1
-        last_category = category
-        self.rollback_df, self.uncat_df = self.uncat_df, self.rollback_df
-        category_dict[category].append(expense)
-        self.__reinitialize_category_df()
-        set_size = self.df_set.shape[0]
-
-    self.settings["categories"] = category_dict
-    self.DataParse.transaction_df["Category"], self.DataParse.transaction_df["Amount"] = vectorize(self.DataParse.categorize)(self.DataParse.transaction_df["Description"], self.DataParse.transaction_df["Amount"])
-    self.__write_settings()
-
-  def __url_option(self):
-    if not self.settings:
-      print("Welcome to the first time setup!\n")
-    print("Please enter the URL of the google spreadsheet you'd like to be using (make sure the spreadsheet already has the monthly and yearly templates!):")
-    while True:
-      try:
-        url = input(">> ").strip()
-        sheet_id = url.split("/")
-        sheet_id = sheet_id[sheet_id.index("d") + 1]
-        self.settings["sheet_id"] = sheet_id
-        self.__write_settings()
-        return
-      except ValueError:
-        print("ERROR: invalid URL. Please try again")
-        continue
-
-  def __first_time_setup(self):
-    print(self.splash + "\n")
-    if "sheet_id" not in self.settings:
-      self.__url_option()
-    print("\nBefore we continue, please make sure that you've shared your Google Sheet with your service account email (with editor privileges)!")
-    input("Press Enter to continue\n>> ")
-
-  def __title(self):
-    while True:
-      os.system(self.clear_str)
-      print(self.splash)
-      print("\n")
-      print("1. Create Budget")
-      print("2. Categorize Expenses")
-      print("3. Change Google Sheet URL")
-      print("4. Exit\n")
-
-      print(f"current sheet id: {self.settings['sheet_id']}")
-
-      transaction_df = self.DataParse.transaction_df
-      if "Category" not in transaction_df:
-        transaction_df["Category"] = "UNK"
-
-      uncategorized_expenses = transaction_df[transaction_df["Category"] == "UNK"].shape[0]
-      print(f"{uncategorized_expenses} uncategorized expenses")
-      print()
-
-      while True:
-        user_selection = input(">> ").strip()
-        if user_selection in ["1", "2", "3", "4"]:
-          break
-        else:
-          print("Invalid selection, please try again")
-      
-      if user_selection == "1":
-        os.system(self.clear_str)
-        print("Creating budget...")
-        break
-      elif user_selection == "2":
-        self.__category_option()
-        continue
-      elif user_selection == "3":
-        self.__url_option()
-        print("Link successfully changed!")
-        sleep(1)
-        continue
-      elif user_selection == "4":
-        exit()
-
-
-if __name__ == "__main__":
-  CLI()
-
-#TODO show the name of the currently set spreadsheet
+import json
+import os
+import sys
+import threading
+from glob import glob
+from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import cProfile
+import instrument
+
+#pandas, gspread and google-auth take the better part of a second to import, they're only loaded on the background threads
+#(or when they're first needed) so the menu shows up right away
+
+# %%
+
+class HeldOutput:
+  """Stands in for stdout while the menu is up. The main thread prints straight through, whatever the background threads
+  print is held back so it doesn't land in the middle of the menu"""
+  def __init__(self, stream):
+    self.stream = stream
+    self.held = []
+
+  def write(self, text):
+    if threading.current_thread() is threading.main_thread():
+      return self.stream.write(text)
+    self.held.append(text)
+    return len(text)
+
+  def flush(self):
+    self.stream.flush()
+
+def parse_statements(settings):
+  from data_parse import DataParse
+  dataparse = DataParse(interactive=False)
+  dataparse.set_settings_file(settings)
+  dataparse.get_transaction_df()
+  return dataparse
+
+def connect(settings):
+  """Authorize and fetch the worksheet listing, the transactions are attached once they're parsed"""
+  from sheet_api import SheetAPI
+  return SheetAPI(settings["sheet_id"], None, engine=settings.get("engine", "batch"), concurrency=settings.get("concurrency", 8), summary=settings.get("summary", "formulas"), interactive=False)
+
+class CLI:
+  def __init__(self):
+    self.splash = r"""
+     ____          _          _  _  _  _   
+    |  _ \        | |        | |(_)(_)| |  
+    | |_) | _   _ | |__    __| | _  _ | |_ 
+    |  _ < | | | || '_ \  / _` || || || __|
+    | |_) || |_| || | | || (_| || || || |_ 
+    |____/  \__,_||_| |_| \__,_|| ||_| \__|
+                               _/ |        
+                              |__/         """
+    self.categories = ["Housing", "Car", "Food", "Media", "Personal", "Travel", "Gift", "Misc", "Credit"]
+
+    self.clear_str = None
+    self.__get_os_clear_str()
+
+    self.DataParse = None
+    self.SheetAPI = None
+
+    self.settings_file = None
+    self.settings = {}
+    self.__get_settings()
+    if not self.settings:
+      self.__first_time_setup()
+
+    #parse the statements and connect to the Google Sheet in the background while the menu is up
+    self.output = HeldOutput(sys.stdout)
+    sys.stdout = self.output
+    self.executor = ThreadPoolExecutor(max_workers=2)
+    self.parsing = self.executor.submit(parse_statements, self.settings)
+    self.connecting = self.executor.submit(connect, self.settings)
+
+    self.__title()
+
+    self.__get_sheet_api()
+    from gspread.exceptions import APIError
+    while True:
+      try:
+        self.SheetAPI.execute()
+        break
+      except APIError:
+        #SheetAPI already backs off on quota errors, getting here means it ran out of retries. The checkpoint lets the
+        #next attempt skip everything that was already written
+        print("Google's write request quota reached, waiting 1 minute before resuming...")
+        sleep(60)
+    print("Done! Please Venmo Dan $5 for running the script")
+    sleep(2)
+    exit()
+
+
+  def __get_os_clear_str(self):
+    if os.name == "nt":
+      self.clear_str = "cls"
+    else:
+      self.clear_str = "clear"
+
+  def __wait(self, future):
+    """The result of a background task. Its failures are shown the way a failure on the main thread would be"""
+    try:
+      return future.result()
+    except RuntimeError as e:
+      self.__release_output()
+      print(e)
+      input("Press Enter to exit\n>> ")
+      exit()
+
+  def __release_output(self):
+    #everything the background threads printed while the menu was up, then back to printing normally
+    if sys.stdout is self.output:
+      sys.stdout = self.output.stream
+      print("".join(self.output.held), end="")
+
+  def __get_data_parse(self):
+    if self.DataParse is None:
+      self.DataParse = self.__wait(self.parsing)
+    return self.DataParse
+
+  def __get_sheet_api(self):
+    self.__release_output()
+    if self.SheetAPI is None:
+      self.SheetAPI = self.__wait(self.connecting)
+      self.SheetAPI.DataParse = self.__get_data_parse()
+    return self.SheetAPI
+
+  def __get_settings(self):
+    filedir = os.path.dirname(os.path.abspath(__file__))
+    self.settings_file = os.path.join(filedir, "settings.conf")
+    files = glob(os.path.join(filedir, "*"))
+    for file in files:
+      if "settings.conf" in file:
+        try:
+          with open(file, "r") as r:
+            self.settings = json.load(r)
+        except:
+          print("ERROR: Invalid settings.conf formatting detected. Please exit the script and attempt to repair or press Enter to begin first time setup.")
+          input(">> ")
+          return
+        self.settings_file = file
+        break
+    
+
+  def __write_settings(self):
+    with open(self.settings_file, "w") as w:
+      json.dump(self.settings, w, indent=1)
+
+  def __category_option(self):
+    os.system(self.clear_str)
+
+    if "categories" not in self.settings:
+      category_dict = {key : [] for key in self.categories}
+    else:
+      category_dict = self.settings["categories"]
+
+    #index the uncategorized transactions by description, each rule then only touches the rows it matches
+    from categorize_session import CategorizeSession
+    transaction_df = self.__get_data_parse().transaction_df
+    uncat_df = transaction_df[~transaction_df["Category"].isin(self.categories + ["Paycheck", "Transfer"])]
+    session = CategorizeSession(uncat_df["Description"], uncat_df["Category"])
+
+    input_count = 0
+    rows_changed = None
+    while len(session) > 0:
+      os.system(self.clear_str)
+      print(session.top(50).to_string(header=False))
+      print(f"\nPlease sort the above expenses in the following categories:\n\t{', '.join(self.categories)}\nIf the expense is a Credit Card payment or deposit, please categorize it as Credit.\nFor example:\n\tamzn : personal\n\tsunoco: car\n\tdiscover des :credit\nInput \"suggest\" to see the rules that would sort the most expenses at once\n")
+      if len(session) < 100 or input_count >= 20:
+        print("When you're satisfied with the sorting, input \"exit\"\n")
+      if rows_changed != None:
+        print(f"{rows_changed} expenses categorized")
+
+      user_input = input()
+
+      if user_input.strip().lower() in ["exit", "quit", "0"]:
+        os.system(self.clear_str)
+        break
+
+      if user_input.strip().lower() in ["suggest", "suggestions", "s"]:
+        accepted = self.__suggest_option(session, category_dict)
+        input_count += accepted[0]
+        rows_changed = accepted[1]
+        continue
+
+      #any number of rules can be undone, most recent first
+      if user_input.strip().lower() in ["undo", "back", "rollback"]:
+        undone = session.undo()
+        if not undone:
+          input("There's nothing to undo you dingus. Press Enter to continue\n")
+          continue
+        input_count -= 1
+        rows_changed = None
+        category_dict[undone[1]].pop()
+        continue
+      
+      if ":" not in user_input:
+        input("Invalid input. Please follow the format of {EXPENSE}:{CATEGORY}. Press Enter to continue\n")
+        continue
+      
+      expense, category = [i.strip() for i in user_input.split(":")]
+      category = category.capitalize()
+      expense = expense.lower()
+
+      if not expense:
+        input("Invalid input. Please follow the format of {EXPENSE}:{CATEGORY}. Press Enter to continue\n")
+        continue
+      if category.capitalize() not in self.categories:
+        input(f"Invalid category. Please only select from: {', '.join(self.categories)}. Press Enter to continue\n")
+        continue
+
+      rows_changed = session.apply(expense, category)
+      if rows_changed > 0:
+        input_count += 1
+        category_dict.setdefault(category, []).append(expense)
+
+    self.settings["categories"] = category_dict
+    self.DataParse.recategorize()
+    self.__write_settings()
+
+  def __suggest_option(self, session, category_dict):
+    """Show the rules covering the most uncategorized expenses and accept any number of them in one go.
+    Returns how many rules were accepted and how many expenses they sorted"""
+    os.system(self.clear_str)
+    print("Finding the most common merchants...")
+    suggestions = session.suggest(15)
+    os.system(self.clear_str)
+    for idx, (expense, rows, example) in enumerate(suggestions, 1):
+      print(f"{idx:>3}. {expense:<32}{rows:>7} expenses  (e.g. {example})")
+    print(f"\nGive any of the above a category by number, separated by commas:\n\t{', '.join(self.categories)}\nFor example:\n\t1:food, 2:car, 4:media\nPress Enter to go back\n")
+
+    rules = 0
+    rows_changed = 0
+    for pair in input().split(","):
+      if not pair.strip():
+        continue
+      number, _, category = [i.strip() for i in pair.partition(":")]
+      category = category.capitalize()
+      if not number.isdigit() or not 1 <= int(number) <= len(suggestions) or category not in self.categories:
+        input(f"Skipping \"{pair.strip()}\", please follow the format of {{NUMBER}}:{{CATEGORY}}. Press Enter to continue\n")
+        continue
+
+      #each accepted suggestion is an ordinary rule, it can be undone on its own
+      expense = suggestions[int(number) - 1][0]
+      changed = session.apply(expense, category)
+      if changed > 0:
+        rules += 1
+        rows_changed += changed
+        category_dict.setdefault(category, []).append(expense)
+    return rules, rows_changed
+
+  def __url_option(self):
+    if not self.settings:
+      print("Welcome to the first time setup!\n")
+    print("Please enter the URL of the google spreadsheet you'd like to be using (make sure the spreadsheet already has the monthly and yearly templates!):")
+    while True:
+      try:
+        url = input(">> ").strip()
+        sheet_id = url.split("/")
+        sheet_id = sheet_id[sheet_id.index("d") + 1]
+        self.settings["sheet_id"] = sheet_id
+        self.__write_settings()
+        return
+      except ValueError:
+        print("ERROR: invalid URL. Please try again")
+        continue
+
+  def __first_time_setup(self):
+    print(self.splash + "\n")
+    if "sheet_id" not in self.settings:
+      self.__url_option()
+    print("\nBefore we continue, please make sure that you've shared your Google Sheet with your service account email (with editor privileges)!")
+    input("Press Enter to continue\n>> ")
+
+  def __title(self):
+    while True:
+      os.system(self.clear_str)
+      print(self.splash)
+      print("\n")
+      print("1. Create Budget")
+      print("2. Categorize Expenses")
+      print("3. Change Google Sheet URL")
+      print("4. Exit\n")
+
+      print(f"current sheet id: {self.settings['sheet_id']}")
+
+      #the count shows up once the background parse is done, the next time the menu is drawn
+      if self.parsing.done() and not self.parsing.exception():
+        uncategorized_expenses = self.parsing.result().category_counts().get("UNK", 0)
+        print(f"{uncategorized_expenses} uncategorized expenses")
+      else:
+        print("reading statements...")
+      print()
+
+      while True:
+        user_selection = input(">> ").strip()
+        if user_selection in ["1", "2", "3", "4"]:
+          break
+        else:
+          print("Invalid selection, please try again")
+      
+      if user_selection == "1":
+        os.system(self.clear_str)
+        print("Creating budget...")
+        break
+      elif user_selection == "2":
+        self.__category_option()
+        continue
+      elif user_selection == "3":
+        self.__url_option()
+        #the prefetched connection was for the old sheet
+        self.connecting = self.executor.submit(connect, self.settings)
+        print("Link successfully changed!")
+        sleep(1)
+        continue
+      elif user_selection == "4":
+        exit()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="PySheetsBudget")
+  parser.add_argument("--profile", metavar="FILE", help="save a cProfile capture of the run, e.g. for snakeviz or pstats")
+  parser.add_argument("--report", metavar="FILE", help="write a JSON report of stage timings and counters when the run ends")
+  args = parser.parse_args()
+
+  profiler = cProfile.Profile() if args.profile else None
+  try:
+    if profiler:
+      profiler.enable()
+    CLI()
+  finally:
+    #the CLI exits by itself, the capture and report are written however it ends
+    if profiler:
+      profiler.disable()
+      profiler.dump_stats(args.profile)
+    if args.report:
+      instrument.write_report(args.report)
+
+#TODO show the name of the currently set spreadsheet
 #TODO show number of uncategorized expenses
\ No newline at end of file
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+# %%
+
+def parse_dates(df):
+  """The Date column as datetimes, NaT where it isn't a date"""
+  return pd.to_datetime(df["Date"], format="%m/%d/%Y", errors="coerce")
+
+def is_transaction(df):
+  """Rows with a date and a numeric amount. Anything else on a worksheet, like a note someone typed in, is left alone"""
+  return (parse_dates(df).notna() & pd.to_numeric(df["Amount"], errors="coerce").notna()).to_numpy()
+
+def row_keys(df):
+  """The (Date, Description, Amount in cents, occurrence count) identity of every row, the occurrence count keeps repeat
+  purchases on the same day apart the same way the Count column does in DataParse. Every row has to be a transaction"""
+  keys = pd.DataFrame({
+    "Date": parse_dates(df),
+    "Description": df["Description"].to_numpy(),
+    "Amount": (pd.to_numeric(df["Amount"]) * 100).round().astype("int64").to_numpy(),
+  })
+  keys["Count"] = keys.groupby(["Date", "Description", "Amount"]).cumcount()
+  return pd.MultiIndex.from_frame(keys)
+
+def diff_month(incoming, current):
+  """Merge a month's incoming transactions into the rows already on its worksheet.
+  `current` holds every worksheet row in order, row i being worksheet row i + 2, and rows without a date are blank rows.
+  Returns the merged dataframe and the writes needed to get there as (row offset, rows) runs, where the offset counts from
+  the first transaction row. Worksheet rows are kept as they are (including their categories), only the rows that end up
+  different from what the worksheet already shows are written. Blank rows are closed up once anything is inserted, rows
+  left over past the end of the merged month are cleared. Rows without a readable date or amount never match a transaction
+  and stay behind the row they follow"""
+  current = current.reset_index(drop=True)
+  filled = current[current["Date"] != ""].reset_index(drop=True)
+  inserts = incoming[~row_keys(incoming).isin(row_keys(filled[is_transaction(filled)]))]
+  if inserts.empty:
+    return filled, []
+
+  #new rows slot in by date, worksheet rows stay ahead of new rows from the same day
+  merged = pd.concat([filled, inserts], ignore_index=True)
+  dates = parse_dates(merged).where(is_transaction(merged)).ffill().bfill()
+  merged = merged.iloc[np.argsort(dates.to_numpy(), kind="stable")].reset_index(drop=True)
+  rows = merged.values.tolist()
+
+  #a row needs writing if it's past the end of the worksheet or differs from what's already in its position
+  changed = np.ones(max(len(merged), len(current)), dtype=bool)
+  overlap = min(len(merged), len(current))
+  if overlap:
+    same = (merged.iloc[:overlap].reset_index(drop=True) == current.iloc[:overlap]).all(axis=1).to_numpy()
+    changed[:overlap] = ~same
+  rows += [[""] * len(merged.columns)] * (len(current) - len(merged))
+
+  #collapse the changed rows into contiguous runs
+  writes = []
+  edges = np.flatnonzero(np.diff(np.concatenate([[0], changed.astype(int), [0]])))
+  for start, stop in zip(edges[::2], edges[1::2]):
+    writes.append((int(start), rows[start:stop]))
+  return merged, writes
@@ -0,0 +1,103 @@
+import random
+import asyncio
+import threading
+from collections import deque
+from time import monotonic, sleep
+from gspread.exceptions import APIError
+import instrument
+
+# %%
+
+#quota (429) and transient server errors are worth waiting out, anything else is a real failure
+RETRY_STATUS = {429, 500, 502, 503}
+
+def status_code(error):
+  """HTTP status of a gspread APIError (across gspread versions) or an aiohttp ClientResponseError"""
+  code = getattr(error, "code", None)
+  if code is None:
+    code = getattr(getattr(error, "response", None), "status_code", None)
+  if code is None:
+    code = getattr(error, "status", None)
+  return code
+
+class MinuteWindow:
+  """Allows at most rate_per_minute calls in any 60 seconds. A short run goes out in one burst, a longer one waits for
+  the oldest of the last rate_per_minute calls to be a minute old"""
+  def __init__(self, rate_per_minute):
+    #start times of the last rate_per_minute calls, some of them possibly still in the future
+    self.starts = deque(maxlen=rate_per_minute)
+    self.lock = threading.Lock()
+
+  def reserve(self):
+    """Claim the next free slot, returns how long the caller has to wait before it may use it"""
+    with self.lock:
+      now = monotonic()
+      start = now if len(self.starts) < self.starts.maxlen else max(now, self.starts[0] + 60)
+      self.starts.append(start)
+      return start - now
+
+  def acquire(self):
+    wait = self.reserve()
+    if wait:
+      sleep(wait)
+    return wait
+
+class QuotaLimiter:
+  """Rolling one minute windows sized to the Sheets per-minute read and write quotas, with exponential backoff and full
+  jitter when Google answers with a 429 anyway"""
+  def __init__(self, reads_per_minute=60, writes_per_minute=60, max_retries=6, base_delay=1, max_delay=64):
+    self.windows = {"read": MinuteWindow(reads_per_minute), "write": MinuteWindow(writes_per_minute)}
+    self.max_retries = max_retries
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+
+    self.retries = 0
+    self.waited = 0
+
+  def __waited(self, wait):
+    self.waited += wait
+    if wait:
+      instrument.record("quota_wait", wait)
+
+  def __retried(self, delay):
+    self.retries += 1
+    self.waited += delay
+    instrument.count("retries")
+    instrument.record("quota_wait", delay)
+
+  def backoff(self, attempt):
+    return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+  def call(self, kind, func, *args, **kwargs):
+    for attempt in range(self.max_retries + 1):
+      self.__waited(self.windows[kind].acquire())
+      instrument.count("api_calls")
+      try:
+        with instrument.stage(f"sheets_{kind}"):
+          return func(*args, **kwargs)
+      except APIError as e:
+        if status_code(e) not in RETRY_STATUS or attempt == self.max_retries:
+          raise
+        delay = self.backoff(attempt)
+        print(f"Google Sheets quota reached, retrying in {delay:.1f} seconds...")
+        self.__retried(delay)
+        sleep(delay)
+
+  async def call_async(self, kind, func, *args, **kwargs):
+    """asyncio version of call, shares the same windows so sync and async callers stay under one quota"""
+    for attempt in range(self.max_retries + 1):
+      wait = self.windows[kind].reserve()
+      self.__waited(wait)
+      if wait:
+        await asyncio.sleep(wait)
+      instrument.count("api_calls")
+      try:
+        with instrument.stage(f"sheets_{kind}"):
+          return await func(*args, **kwargs)
+      except Exception as e:
+        if status_code(e) not in RETRY_STATUS or attempt == self.max_retries:
+          raise
+        delay = self.backoff(attempt)
+        print(f"Google Sheets quota reached, retrying in {delay:.1f} seconds...")
+        self.__retried(delay)
+        await asyncio.sleep(delay)
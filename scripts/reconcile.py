@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+# %%
+
+def match_transfers(df, days=3):
+  """Pair up money moving between accounts, e.g. a card payment that's a cost on the bank statement and a credit of the same
+  amount on the card statement a day or two later. Only rows the category rules left uncategorized are considered, and the
+  two rows of a pair have opposite signs, the same amount, come from different sources and are at most `days` days apart.
+  Returns an (n, 2) array of (cost, credit) row positions.
+  Candidates are hash joined on (amount in cents, date bucket) where a bucket is days + 1 wide, so a pair is always in the
+  same or a neighbouring bucket and only rows with the same amount are ever compared. Each row is used at most once, the
+  closest pairs in time are taken first"""
+  candidates = df["Category"].isna() | (df["Category"] == "UNK") if "Category" in df else pd.Series(True, index=df.index)
+  rows = np.flatnonzero(candidates.to_numpy())
+  amounts = df["Amount"].to_numpy()[rows]
+  day = df["Date"].to_numpy()[rows].astype("datetime64[D]").astype("int64")
+  index = pd.DataFrame({"row": rows, "cents": np.abs(amounts), "day": day, "bucket": day // (days + 1),
+                        "source": pd.Series(df["Source"].to_numpy()[rows], dtype=object)})
+
+  costs = index[amounts > 0]
+  credits = index[amounts < 0]
+  pairs = pd.concat([costs.merge(credits.assign(bucket=credits["bucket"] + shift), on=["cents", "bucket"], suffixes=("", "_credit"))
+                     for shift in (-1, 0, 1)], ignore_index=True)
+  pairs["gap"] = (pairs["day"] - pairs["day_credit"]).abs()
+  pairs = pairs[(pairs["gap"] <= days) & (pairs["source"] != pairs["source_credit"])]
+  pairs = pairs.sort_values(["gap", "row", "row_credit"], kind="stable")
+
+  #greedy one to one assignment, only rows that share an amount ever compete so this stays close to linear
+  matched = []
+  used = set()
+  for cost, credit in zip(pairs["row"].tolist(), pairs["row_credit"].tolist()):
+    if cost in used or credit in used:
+      continue
+    used.update((cost, credit))
+    matched.append((cost, credit))
+  return np.array(matched, dtype="int64").reshape(-1, 2)
@@ -0,0 +1,46 @@
+import os
+import json
+import pandas as pd
+
+# %%
+
+class MonthlyRollup:
+  """Category totals per month in integer cents, kept on disk between runs. Every month remembers a hash of the
+  transactions it was computed from, so only months whose transactions changed are summed again"""
+  def __init__(self, path):
+    self.path = path
+    self.months = {}
+    if os.path.exists(path):
+      with open(path, "r") as r:
+        self.months = json.load(r)
+    self.recomputed = 0
+
+  def update(self, date_map, months=None):
+    """Bring the totals in line with a MonthMap, the stale months are summed in one groupby. Given months only those are
+    checked, the rest are trusted to be current"""
+    hashes = {}
+    stale = {}
+    for month, (start, stop) in date_map.slices.items():
+      if months is not None and month not in months:
+        continue
+      month_df = date_map.transaction_df.iloc[start:stop]
+      hashes[month] = str(pd.util.hash_pandas_object(month_df, index=False).sum())
+      if self.months.get(month, {}).get("hash") != hashes[month]:
+        stale[month] = month_df
+
+    #months that fell out of the transaction range are dropped
+    self.months = {month: self.months[month] for month in date_map.slices if month in self.months}
+    for month in stale:
+      self.months[month] = {"hash": hashes[month], "totals": {}}
+    if stale:
+      totals = pd.concat(stale, names=["Month"]).groupby(["Month", "Category"], observed=True)["Amount"].sum()
+      for (month, category), amount in totals.items():
+        self.months[month]["totals"][category] = int(amount)
+    self.recomputed = len(stale)
+
+    with open(self.path, "w") as w:
+      json.dump(self.months, w, indent=1)
+
+  def total(self, month, category):
+    """Total of a category in a month, in cents"""
+    return self.months.get(month, {}).get("totals", {}).get(category, 0)
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+# %%
+
+#dates like 01/31 or 01-31-2024, and any token with two or more digits in it (store numbers, reference ids, card
+#suffixes), names like 7-eleven keep their single digit
+DATES = r"\b\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?\b"
+NUMBERED = r"\S*\d\S*\d\S*"
+
+def normalize_descriptions(lowered):
+  """Strip the per-transaction noise out of lowercase descriptions so purchases from the same merchant look alike,
+  e.g. "wegmans #45" and "wegmans #112" both become "wegmans" """
+  normalized = pd.Series(lowered, dtype=object).str.replace(DATES, " ", regex=True).str.replace(NUMBERED, " ", regex=True)
+  return normalized.str.replace(r"\s+", " ", regex=True).str.strip()
+
+def common_prefix(tokens):
+  """Longest run of leading tokens every token list shares"""
+  first, last = min(tokens), max(tokens)
+  size = 0
+  while size < min(len(first), len(last)) and first[size] == last[size]:
+    size += 1
+  return first[:size]
+
+def strip_prefixes(tokens, stop_share=0.2, min_merchants=3):
+  """Drop the leading tokens that only say how a card was used, like the "checkcard" or "purchase authorized on" Bank of
+  America puts in front of every description. A prefix is one when it starts at least `stop_share` of all descriptions
+  and at least `min_merchants` different tokens follow it"""
+  tokens = list(tokens)
+  while True:
+    groups = {}
+    for idx, description_tokens in enumerate(tokens):
+      if len(description_tokens) > 1:
+        groups.setdefault(description_tokens[0], []).append(idx)
+    stripped = False
+    for members in groups.values():
+      if len(members) < stop_share * len(tokens):
+        continue
+      prefix = common_prefix([tokens[idx] for idx in members])
+      if len({tuple(tokens[idx][len(prefix):len(prefix) + 1]) for idx in members}) < min_merchants:
+        continue
+      for idx in members:
+        if len(tokens[idx]) > len(prefix):
+          tokens[idx] = tokens[idx][len(prefix):]
+      stripped = True
+    if not stripped:
+      return tokens
+
+def suggest_rules(descriptions, counts, limit=10, min_length=3, shortlist=5):
+  """Propose up to `limit` expense rules for distinct descriptions carried by `counts` rows each. Returns (rule, rows
+  covered, example description) tuples, best first.
+  Descriptions are clustered by the first token of their normalized form, once prefixes shared by many merchants are
+  stripped, and each cluster proposes the tokens all of its members start with, cut back until it's a literal substring of
+  every member (rules are substring matches). A rule that also matches another cluster's descriptions would lump merchants
+  together and is dropped. The shortlisted candidates are then picked greedily, each one by the rows it covers that the
+  rules before it don't"""
+  descriptions = np.asarray(descriptions, dtype=object)
+  counts = np.asarray(counts, dtype="int64")
+  if not len(descriptions):
+    return []
+  lowered = pd.Series(descriptions, dtype=object).str.lower().to_numpy()
+
+  tokens = strip_prefixes(normalize_descriptions(lowered).str.split(" "))
+  clusters = {}
+  for idx, description_tokens in enumerate(tokens):
+    if description_tokens[0]:
+      clusters.setdefault(description_tokens[0], []).append(idx)
+
+  candidates = {}
+  for members in clusters.values():
+    prefix = common_prefix([tokens[idx] for idx in members])
+    while prefix and not all(" ".join(prefix) in lowered[idx] for idx in members):
+      prefix = prefix[:-1]
+    rule = " ".join(prefix)
+    if len(rule) >= min_length:
+      candidates[rule] = candidates.get(rule, 0) + int(counts[members].sum())
+
+  #only the clusters that could plausibly make the cut get the exact coverage scan over every description
+  shortlisted = sorted(candidates, key=candidates.get, reverse=True)[:limit * shortlist]
+  series = pd.Series(lowered, dtype=object)
+  masks = {rule: series.str.contains(rule, regex=False).to_numpy() for rule in shortlisted}
+  merchants = np.array([i[0] for i in tokens], dtype=object)
+  masks = {rule: mask for rule, mask in masks.items() if len(set(merchants[mask])) == 1}
+
+  suggestions = []
+  covered = np.zeros(len(lowered), dtype=bool)
+  while masks and len(suggestions) < limit:
+    gains = {rule: int(counts[mask & ~covered].sum()) for rule, mask in masks.items()}
+    rule = max(gains, key=gains.get)
+    if not gains[rule]:
+      break
+    mask = masks.pop(rule)
+    example = descriptions[np.flatnonzero(mask & ~covered)[np.argmax(counts[mask & ~covered])]]
+    suggestions.append((rule, gains[rule], example))
+    covered |= mask
+  return suggestions
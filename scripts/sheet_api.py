@@ -1,175 +1,376 @@
-import os
-import gspread
-from google.oauth2.service_account import Credentials
-import pandas as pd
-import datetime as dt
-from dateutil.relativedelta import relativedelta
-
-# %%
-
-class SheetAPI:
-  def __init__(self, sheet_id, DataParse):
-    filedir = os.path.dirname(os.path.abspath(__file__))
-    scopes = ["https://www.googleapis.com/auth/spreadsheets"]
-    creds = Credentials.from_service_account_file(os.path.join(filedir, "credentials.json"), scopes=scopes)
-    client = gspread.authorize(creds)
-
-    self.sheet_id = sheet_id
-    self.workbook = client.open_by_key(self.sheet_id)
-
-    #get all the current worksheet titles and ids and store them in a map
-    print("Fetching worksheets...")
-    self.worksheets = {i.title: i for i in self.workbook.worksheets()}
-
-    #assign the monthly and yearly formatted worksheets
-    self.monthly_formatted_sheet = None
-    self.yearly_formatted_sheet = None
-    for worksheet in self.worksheets:
-      if "monthly_format" in worksheet:
-        self.monthly_formatted_sheet = self.workbook.worksheet(worksheet)
-      if "yearly_format" in worksheet:
-        self.yearly_formatted_sheet = self.workbook.worksheet(worksheet)
-    if not self.monthly_formatted_sheet:
-      print("monthly_format worksheet not found in the given Google sheet. Please run the script again when you've got both a monthly_format worksheet and a yearly_format worksheet in the given Google Sheet.")
-      input("Press Enter to exit the script\n>> ")
-      exit()
-    if not self.yearly_formatted_sheet:
-      print("yearly_format worksheet not found in the given Google sheet. Please run the script again when you've got both a monthly_format worksheet and a yearly_format worksheet in the given Google Sheet.")
-      input("Press Enter to exit the script\n>> ")
-      exit()
-
-    self.DataParse = DataParse
-  
-  def __create_monthly_sheets(self):
-    """Create the month by month budget worksheets"""
-    #iterate through the monthly dataframes and populate their corresponding worksheets
-    print("Sorting expenses by month...")
-    self.DataParse.get_mapped_df()
-    for month, df in self.DataParse.date_map.items():
-      #if this month already exists, check if the dataframe has more entries than the worksheet. If so, update the worksheet and move on
-      if month in self.worksheets:
-        current_sheet = self.worksheets[month]
-        #if the first date in the statements comes before the first date in the worksheet, or the last date in the statements comes after the last date in the worksheets, then the worksheet is missing some entries
-        worksheet_dates = current_sheet.col_values(1)
-        worksheet_dates = [dt.datetime.strptime(i, "%m/%d/%Y") for i in [worksheet_dates[1], worksheet_dates[-1]]]
-        if dt.datetime.strptime(df["Date"].iloc[0], "%m/%d/%Y") < worksheet_dates[0] or dt.datetime.strptime(df["Date"].iloc[-1], "%m/%d/%Y") > worksheet_dates[-1]:
-          print(f"Creating {dt.datetime.strptime(df['Date'].iloc[0], "%m/%d/%Y").strftime("%b %Y")}")
-          #extract the worksheet data into its own dataframe
-          ws_df = pd.DataFrame(current_sheet.get_values("A2:D1000"), columns=["Date", "Description", "Amount", "Category"])
-          #convert worksheet string values to float
-          ws_df["Amount"] = ws_df["Amount"].str.replace("$", "").str.replace(",", "").astype(float)
-          #combine the transaction dataframe with the worksheet dataframe and keep the existing worksheet entries (more accurate category)
-          df = pd.concat([df, ws_df]).drop_duplicates(subset=["Date", "Description", "Amount"], keep="last").sort_values(by="Date").reset_index(drop=True)
-          print(f"rewriting {month}")
-          #overwrite the worksheet
-          current_sheet.update(df.values.tolist(), "A2:D1000")
-        continue
-
-      print(f"Creating {dt.datetime.strptime(df['Date'].iloc[0], "%m/%d/%Y").strftime("%b %Y")}")
-      #duplicate the monthly formatted sheet for each month
-      current_sheet = self.monthly_formatted_sheet.duplicate(new_sheet_name=month)
-      #make the duplicated worksheet visible
-      current_sheet.show()
-      #populate the worksheet with the dataframe's values
-      current_sheet.update(df.values.tolist(), "A2:D1000")
-      self.worksheets[month] = current_sheet
-  
-  def __create_yearly_summary(self):
-    """Create the yearly summary budget worksheets using the existing month by month sheets"""
-    #find all the different budget categories and store them in a map with their corresponding acell sum locations
-    categories = [i for i in self.yearly_formatted_sheet.col_values(1) if i]
-    category_locations = [i[i.find("G"):] for i in self.yearly_formatted_sheet.col_values(2, value_render_option="FORMULA")[1:len(categories)+1]]
-    categories = dict(zip(categories, category_locations))
-
-    #initialize storage containers
-    month_headers = []
-    cell_template = []
-    content = []
-
-    #find the cutoff years for the summary worksheet(s)
-    start_year = dt.datetime(self.DataParse.first_date.year, 1, 1)
-    end_year = dt.datetime(self.DataParse.last_date.year + 1, 1, 1)
-    current_date = start_year
-    while (current_date < end_year):
-      current_year = current_date.year
-      header = current_date.strftime("%b %Y")
-      #if the month is in the worksheet, then we'll populate the summary worksheet with data from that month
-      if header in self.worksheets:
-        ws_id = self.worksheets[header].id
-        month_headers.append(f'=HYPERLINK("#gid={ws_id}", "{header}")')
-        cell_template.append(f"='{header}'!G2") #G2 is arbitrary, just need something for later replacement
-      #otherwise add the year header accompanied with blank data
-      else:
-        month_headers.append(header)
-        cell_template.append("")
-
-      #add a month to the current date to keep iterating through the while loop
-      current_date += relativedelta(months=1)
-
-      #if we just went from Dec to Jan or this is the last date before the while loop would end1
-      if ((current_year - current_date.year) or current_date >= end_year):
-        #store the month headers and all corresponding month data in the container for easy cell updating later
-        content.append(month_headers)
-        #using the cell template, we can dynamically store all the budget categories we need with the category map
-        for cell_loc in categories.values():
-          content.append([i.replace("G2", cell_loc) for i in cell_template])
-        
-        #overwrite the year summary worksheet regardless if its already in the workbook (it's not computationally intensive)
-        ws_name = f"{current_year} Summary"
-        if ws_name in self.worksheets:
-          current_sheet = self.worksheets[ws_name]
-        else:
-          current_sheet = self.yearly_formatted_sheet.duplicate(new_sheet_name=ws_name)
-          current_sheet.show()
-          self.worksheets[ws_name] = current_sheet
-
-        print(f"Creating summary for {current_year}...")
-        current_sheet.update(content, f"B1:M{len(categories) + 1}", raw=False)
-
-        #reset the containers for the next year iteration
-        month_headers = []
-        cell_template = []
-        content = []
-  
-  def __cleanup(self):
-    """Cleans up the worksheet order and hides copious monthly worksheets"""
-    print("Cleaning up Google Sheet...")
-    
-    #TODO fix this
-    if "Sheet" in self.worksheets:
-      for worksheet in self.worksheets:
-        if "Sheet" in worksheet: self.workbook.del_worksheet(self.worksheets[worksheet])
-
-    #Isolate and order the month by month budget worksheets
-    ordered_sheets_monthly = sorted([dt.datetime.strptime(i, "%b %Y") for i in self.worksheets.keys() if "_" not in i and "Summary" not in i and "Sheet" not in i])
-    ordered_sheets_monthly = [self.worksheets[i.strftime("%b %Y")] for i in ordered_sheets_monthly]
-
-    #Isolate and order the yearly summary budget worksheets
-    ordered_sheets_yearly = [self.worksheets[j] for j in sorted([i for i in self.worksheets if "Summary" in i])]
-
-    #Hide the formatting worksheets and the month by month budget worksheets
-    ordered_sheets_master = [self.worksheets["monthly_format"], self.worksheets["yearly_format"]] 
-    for sheet in ordered_sheets_master + ordered_sheets_monthly:
-      if not sheet.isSheetHidden: sheet.hide()
-
-    #Reorder the worksheets such that its hidden, formatted sheets -> summary sheets -> hidden, monthly sheets
-    ordered_sheets_master += ordered_sheets_yearly + ordered_sheets_monthly
-    self.workbook.reorder_worksheets(ordered_sheets_master)
-  
-  def execute(self):
-    """Create monthly sheets, the corresponding yearly summary, and clean up the work sheet order and visibility"""
-    self.__create_monthly_sheets()
-    self.__create_yearly_summary()
-    self.__cleanup()
-
-
-
-if __name__ == "__main__":
-  from data_parse import DataParse
-
-  SHEET_ID = "1n-C8Ki2la4qPq72eGRSYHOi_0Rr7ccL_DBoJLvTZ7rI"
-
-  sheet_api = SheetAPI(SHEET_ID, DataParse())
-  sheet_api.execute()
-
-  print()
\ No newline at end of file
+import os
+import re
+import gspread
+from google.oauth2.service_account import Credentials
+import pandas as pd
+import datetime as dt
+from dateutil.relativedelta import relativedelta
+from sheet_batch import SheetBatch, a1
+from month_diff import diff_month
+from rate_limit import QuotaLimiter
+from rollup import MonthlyRollup
+import instrument
+import json
+
+# %%
+
+#the tab Google puts in a new spreadsheet
+DEFAULT_TABS = ["Sheet", "Sheet1"]
+
+def load_credentials(credentials_file=None):
+  """Service account credentials, from credentials.json next to the scripts unless another file is given"""
+  credentials_file = credentials_file or os.path.join(os.path.dirname(os.path.abspath(__file__)), "credentials.json")
+  return Credentials.from_service_account_file(credentials_file, scopes=["https://www.googleapis.com/auth/spreadsheets"])
+
+class SheetAPI:
+  def __init__(self, sheet_id, DataParse, max_requests=100, reads_per_minute=60, writes_per_minute=60, engine="batch", concurrency=8, summary="formulas", backend=None, creds=None, client=None, interactive=True, checkpoint_file=None, rollup_file=None):
+    filedir = os.path.dirname(os.path.abspath(__file__))
+    self.sheet_id = sheet_id
+    self.interactive = interactive
+
+    #any workbook speaking the gspread Spreadsheet calls SheetBatch makes can stand in for the live one, e.g. a FakeWorkbook
+    #for offline runs and benchmarks. Syncing several budgets can share one authorized client
+    if backend is None:
+      self.creds = creds or load_credentials()
+      client = client or gspread.authorize(self.creds)
+      self.workbook = client.open_by_key(self.sheet_id)
+    else:
+      self.creds = None
+      self.workbook = backend
+    #every read and write goes through the batch so the whole run costs a handful of round trips, and through the limiter
+    #so we stay under the per-minute quotas
+    self.limiter = QuotaLimiter(reads_per_minute, writes_per_minute)
+    self.batch = SheetBatch(self.workbook, max_requests, self.limiter)
+
+    #months and summaries already written by an interrupted run are recorded here so a retry can pick up where it stopped.
+    #Every workbook has its own, syncing one budget never touches another's resume point
+    self.checkpoint_file = checkpoint_file or os.path.join(filedir, f"sync_checkpoint_{sheet_id}.json")
+    self.checkpoint = None
+    self.interrupted = False
+
+    #"batch" queues new months into the batch like everything else, "async" creates them concurrently with AsyncSheets
+    self.engine = engine
+    self.concurrency = concurrency
+    self.async_sheets = None
+
+    #"formulas" fills the yearly summaries with references into the month worksheets, "values" writes totals computed here
+    #from the transactions, which keeps Google from recalculating hundreds of cross-sheet references. The month totals are
+    #cached per workbook so several budgets don't keep invalidating each other's
+    self.summary = summary
+    rollup_file = rollup_file or os.path.join(filedir, f"rollup_cache_{sheet_id}.json")
+    self.rollup = MonthlyRollup(rollup_file) if summary == "values" else None
+
+    #get all the current worksheet titles and properties and store them in a map
+    self.__fetch_worksheets()
+
+    #assign the monthly and yearly formatted worksheets
+    self.monthly_formatted_sheet = None
+    self.yearly_formatted_sheet = None
+    for worksheet in self.worksheets:
+      if "monthly_format" in worksheet:
+        self.monthly_formatted_sheet = self.worksheets[worksheet]
+      if "yearly_format" in worksheet:
+        self.yearly_formatted_sheet = self.worksheets[worksheet]
+    for name, sheet in [("monthly_format", self.monthly_formatted_sheet), ("yearly_format", self.yearly_formatted_sheet)]:
+      if sheet:
+        continue
+      message = f"{name} worksheet not found in the given Google sheet. Please run the script again when you've got both a monthly_format worksheet and a yearly_format worksheet in the given Google Sheet."
+      if not self.interactive:
+        raise RuntimeError(message)
+      print(message)
+      input("Press Enter to exit the script\n>> ")
+      exit()
+
+    self.DataParse = DataParse
+
+  @instrument.stage("fetch_worksheets")
+  def __fetch_worksheets(self):
+    print("Fetching worksheets...")
+    self.worksheets = {i["title"]: i for i in self.batch.sheets()}
+
+    #snapshot every month worksheet's transactions in a single values.batchGet, the stale checks and merges run against this
+    months = [i for i in self.worksheets if self.__is_month(i)]
+    self.snapshot = dict(zip(months, self.batch.get([a1(i, "A2:D1000") for i in months]))) if months else {}
+
+  def __load_checkpoint(self):
+    self.checkpoint = {"sheet_id": self.sheet_id, "months": {}, "summaries": []}
+    if os.path.exists(self.checkpoint_file):
+      with open(self.checkpoint_file, "r") as r:
+        checkpoint = json.load(r)
+      #a checkpoint left behind for another workbook doesn't apply here
+      if checkpoint.get("sheet_id") == self.sheet_id:
+        self.checkpoint = checkpoint
+        print(f"Resuming, {len(checkpoint['months'])} month(s) and {len(checkpoint['summaries'])} summaries already written")
+
+  def __flush(self, months=None, summaries=None):
+    """Send everything queued, then checkpoint the months/summaries those writes completed"""
+    self.batch.flush()
+    self.checkpoint["months"].update(months or {})
+    self.checkpoint["summaries"] += summaries or []
+    with open(self.checkpoint_file, "w") as w:
+      json.dump(self.checkpoint, w, indent=1)
+
+  def __is_month(self, title):
+    try:
+      dt.datetime.strptime(title, "%b %Y")
+      return True
+    except ValueError:
+      return False
+
+  def __snapshot_df(self, month):
+    """The month worksheet's transactions from the snapshot as a dataframe, row i is worksheet row i + 2. Blank rows are
+    kept as placeholders so diff_month's write offsets line up with the worksheet"""
+    #the API leaves off trailing empty cells, pad the rows back out to all four columns
+    ws_df = pd.DataFrame([i + [""] * (4 - len(i)) for i in self.snapshot.get(month, [])], columns=["Date", "Description", "Amount", "Category"])
+    #convert worksheet string values to float, blank amounts and anything else that isn't a number are kept as typed
+    amounts = pd.to_numeric(ws_df["Amount"].str.replace("$", "").str.replace(",", ""), errors="coerce")
+    ws_df["Amount"] = amounts.astype(object).where(amounts.notna(), ws_df["Amount"])
+    return ws_df
+
+  def __add_worksheet(self, source, title, hidden):
+    """Queue a copy of a formatted worksheet and track its properties until the batch is flushed"""
+    sheet_id = self.batch.duplicate(source["sheetId"], title)
+    #hidden=None means the copy inherits the source's visibility, which we don't know for certain
+    if hidden is not None:
+      self.batch.set_hidden(sheet_id, hidden)
+    self.worksheets[title] = {"sheetId": sheet_id, "title": title, "hidden": hidden}
+    return self.worksheets[title]
+
+  @instrument.stage("monthly_sheets")
+  def __create_monthly_sheets(self, months=None):
+    """Create the month by month budget worksheets, only the given months if there are any"""
+    #iterate through the monthly dataframes and populate their corresponding worksheets
+    print("Sorting expenses by month...")
+    self.DataParse.get_mapped_df()
+    queued = {}
+    new_months = []
+    new_hashes = {}
+    for month in self.DataParse.date_map:
+      #months without any transactions only need a column in the yearly summary
+      if self.DataParse.date_map.is_empty(month) or (months is not None and month not in months):
+        continue
+      df = self.DataParse.date_map[month]
+
+      #skip months an interrupted run already synced with exactly these transactions
+      month_hash = str(pd.util.hash_pandas_object(df, index=False).sum())
+      if self.checkpoint["months"].get(month) == month_hash:
+        continue
+
+      #if this month already exists, only write the transactions the worksheet is missing and leave the rest alone
+      if month in self.worksheets:
+        df, writes = diff_month(df, self.__snapshot_df(month))
+        if writes:
+          print(f"Updating {month}, {sum(len(rows) for _, rows in writes)} rows changed")
+          instrument.count("months_updated")
+          #row offsets count from the first transaction row, which is row 2 of the worksheet
+          for offset, rows in writes:
+            self.batch.write(month, f"A{offset + 2}:D{offset + len(rows) + 1}", rows)
+          self.snapshot[month] = [[str(i) for i in row] for row in df.values.tolist()]
+        queued[month] = month_hash
+      elif self.engine == "async":
+        #created concurrently once every existing month is queued
+        sheet_id = self.batch.new_sheet_id()
+        self.worksheets[month] = {"sheetId": sheet_id, "title": month, "hidden": False}
+        rows = df.values.tolist()
+        self.snapshot[month] = [[str(i) for i in row] for row in rows]
+        new_months.append((sheet_id, month, rows))
+        instrument.count("months_created")
+        new_hashes[month] = month_hash
+      else:
+        print(f"Creating {month}")
+        instrument.count("months_created")
+        #duplicate the monthly formatted sheet for each month, __cleanup sets its final visibility
+        self.__add_worksheet(self.monthly_formatted_sheet, month, hidden=None)
+        #populate the worksheet with the dataframe's values
+        self.__write_month(month, df)
+        queued[month] = month_hash
+
+      #send a full batch as soon as we have one, so a failure later on doesn't lose these months
+      if self.batch.pending() >= self.batch.max_requests:
+        self.__flush(months=queued)
+        queued = {}
+
+    self.__flush(months=queued)
+
+    if new_months:
+      print(f"Creating {len(new_months)} months, {self.concurrency} at a time...")
+      self.__get_async_sheets().create_months(self.monthly_formatted_sheet["sheetId"], new_months)
+      #nothing is queued, this only checkpoints the new months
+      self.__flush(months=new_hashes)
+
+  def __get_async_sheets(self):
+    if self.async_sheets is None:
+      if self.creds is None:
+        raise ValueError("The async engine talks to the Sheets REST API directly and needs a live workbook")
+      #aiohttp is only needed for the async engine
+      from async_sheets import AsyncSheets
+      from google.auth.transport.requests import Request
+      if not self.creds.valid:
+        self.creds.refresh(Request())
+      self.async_sheets = AsyncSheets(self.sheet_id, self.creds.token, self.limiter, self.concurrency)
+    return self.async_sheets
+
+  def __write_month(self, month, df):
+    rows = df.values.tolist()
+    self.batch.write(month, "A2:D1000", rows)
+    #keep the snapshot in step with what the worksheet will hold once the batch is flushed
+    self.snapshot[month] = [[str(i) for i in row] for row in rows]
+
+  @instrument.stage("yearly_summary")
+  def __create_yearly_summary(self, months=None):
+    """Create the yearly summary budget worksheets using the existing month by month sheets, only the years of the given
+    months if there are any"""
+    years = None if months is None else {dt.datetime.strptime(i, "%b %Y").year for i in months}
+
+    #find all the different budget categories and store them in a map with their corresponding acell sum locations
+    ranges = [a1(self.yearly_formatted_sheet["title"], "A:B")]
+    if self.rollup:
+      ranges.append(a1(self.monthly_formatted_sheet["title"], "G:G"))
+    grids = self.batch.get(ranges, "FORMULA", "COLUMNS")
+    columns = grids[0] + [[], []]
+    category_column, formula_column = columns[0], columns[1]
+    categories = [i for i in category_column if i]
+    category_locations = [i[i.find("G"):] for i in formula_column[1:len(categories)+1]]
+    categories = dict(zip(categories, category_locations))
+
+    #rows of the month template that add up other rows, e.g. the Total row's =SUM(G2:G9), aren't a transaction category
+    #and get the sum of the rows they cover
+    sums = {}
+    if self.rollup:
+      for row, formula in enumerate((grids[1] + [[]])[0], 1):
+        match = re.fullmatch(r"=SUM\(G(\d+):G(\d+)\)", str(formula).replace(" ", ""), re.IGNORECASE)
+        if match:
+          sums[f"G{row}"] = [f"G{i}" for i in range(int(match[1]), int(match[2]) + 1)]
+    category_at = {cell_loc: category for category, cell_loc in categories.items()}
+
+    #only the months whose transactions changed since the last run are summed again
+    if self.rollup:
+      self.rollup.update(self.DataParse.date_map, months)
+      print(f"Totalled {self.rollup.recomputed} changed month(s)...")
+
+    #initialize storage containers
+    summaries = []
+    month_headers = []
+    cell_template = []
+    months = []
+    content = []
+
+    #find the cutoff years for the summary worksheet(s)
+    start_year = dt.datetime(self.DataParse.first_date.year, 1, 1)
+    end_year = dt.datetime(self.DataParse.last_date.year + 1, 1, 1)
+    current_date = start_year
+    while (current_date < end_year):
+      current_year = current_date.year
+      header = current_date.strftime("%b %Y")
+      #if the month is in the worksheet, then we'll populate the summary worksheet with data from that month
+      if header in self.worksheets:
+        ws_id = self.worksheets[header]["sheetId"]
+        month_headers.append(f'=HYPERLINK("#gid={ws_id}", "{header}")')
+        cell_template.append(f"='{header}'!G2") #G2 is arbitrary, just need something for later replacement
+        months.append(header)
+      #otherwise add the year header accompanied with blank data
+      else:
+        month_headers.append(header)
+        cell_template.append("")
+        months.append(None)
+
+      #add a month to the current date to keep iterating through the while loop
+      current_date += relativedelta(months=1)
+
+      #if we just went from Dec to Jan or this is the last date before the while loop would end1
+      if ((current_year - current_date.year) or current_date >= end_year):
+        #store the month headers and all corresponding month data in the container for easy cell updating later
+        content.append(month_headers)
+        #using the cell template, we can dynamically store all the budget categories we need with the category map
+        for category, cell_loc in categories.items():
+          if self.rollup:
+            content.append([self.__rollup_total(i, cell_loc, category_at, sums) / 100 if i else "" for i in months])
+          else:
+            content.append([i.replace("G2", cell_loc) for i in cell_template])
+
+        #overwrite the year summary worksheet regardless if its already in the workbook (it's not computationally intensive),
+        #unless an interrupted run already got to it
+        ws_name = f"{current_year} Summary"
+        if ws_name not in self.checkpoint["summaries"] and (years is None or current_year in years):
+          if ws_name not in self.worksheets:
+            self.__add_worksheet(self.yearly_formatted_sheet, ws_name, hidden=False)
+
+          print(f"Creating summary for {current_year}...")
+          self.batch.write(ws_name, f"B1:M{len(categories) + 1}", content, raw=False)
+          summaries.append(ws_name)
+
+        #reset the containers for the next year iteration
+        month_headers = []
+        cell_template = []
+        months = []
+        content = []
+
+    self.__flush(summaries=summaries)
+
+  def __rollup_total(self, month, cell_loc, category_at, sums):
+    """What the month template's cell holds for a month, in cents"""
+    if cell_loc in sums:
+      return sum(self.__rollup_total(month, i, category_at, sums) for i in sums[cell_loc] if i in category_at and i != cell_loc)
+    return self.rollup.total(month, category_at[cell_loc])
+
+  @instrument.stage("cleanup")
+  def __cleanup(self):
+    """Cleans up the worksheet order and hides copious monthly worksheets"""
+    print("Cleaning up Google Sheet...")
+
+    #only the blank tab a new spreadsheet starts out with is removed, the user's own tabs (e.g. "Balance Sheet") are left alone
+    for worksheet in [i for i in DEFAULT_TABS if i in self.worksheets]:
+      self.batch.delete(self.worksheets.pop(worksheet)["sheetId"])
+
+    #Isolate and order the month by month budget worksheets
+    ordered_sheets_monthly = sorted([dt.datetime.strptime(i, "%b %Y") for i in self.worksheets.keys() if "_" not in i and "Summary" not in i and "Sheet" not in i])
+    ordered_sheets_monthly = [self.worksheets[i.strftime("%b %Y")] for i in ordered_sheets_monthly]
+
+    #Isolate and order the yearly summary budget worksheets
+    ordered_sheets_yearly = [self.worksheets[j] for j in sorted([i for i in self.worksheets if "Summary" in i])]
+
+    #Hide the formatting worksheets and the month by month budget worksheets
+    ordered_sheets_master = [self.worksheets["monthly_format"], self.worksheets["yearly_format"]]
+    for sheet in ordered_sheets_master + ordered_sheets_monthly:
+      if not sheet.get("hidden"):
+        self.batch.set_hidden(sheet["sheetId"], True)
+        sheet["hidden"] = True
+
+    #Reorder the worksheets such that its hidden, formatted sheets -> summary sheets -> hidden, monthly sheets
+    ordered_sheets_master += ordered_sheets_yearly + ordered_sheets_monthly
+    self.batch.reorder([i["sheetId"] for i in ordered_sheets_master])
+
+  def execute(self, months=None):
+    """Create monthly sheets, the corresponding yearly summary, and clean up the work sheet order and visibility.
+    Given months ("%b %Y"), e.g. the ones DataParse.add_statements touched, only those months and their years' summaries
+    are synced. The worksheet map and snapshot from the last run are reused either way"""
+    #a previous attempt died partway through, start over from what's actually in the workbook
+    if self.interrupted:
+      self.batch.clear()
+      self.__fetch_worksheets()
+    self.interrupted = True
+    self.__load_checkpoint()
+
+    self.__create_monthly_sheets(months)
+    self.__create_yearly_summary(months)
+    self.__cleanup()
+    self.batch.flush()
+    self.interrupted = False
+
+    #everything made it into the workbook, the next run starts from scratch
+    if os.path.exists(self.checkpoint_file):
+      os.remove(self.checkpoint_file)
+    round_trips = self.batch.round_trips + (self.async_sheets.round_trips if self.async_sheets else 0)
+    print(f"Finished in {round_trips} Google Sheets API round trips ({self.limiter.retries} retries, {self.limiter.waited:.1f}s waiting on quota)")
+
+
+
+if __name__ == "__main__":
+  from data_parse import DataParse
+
+  SHEET_ID = "1n-C8Ki2la4qPq72eGRSYHOi_0Rr7ccL_DBoJLvTZ7rI"
+
+  sheet_api = SheetAPI(SHEET_ID, DataParse())
+  sheet_api.execute()
+
+  print()
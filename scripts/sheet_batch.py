@@ -0,0 +1,86 @@
+from rate_limit import QuotaLimiter
+import instrument
+
+# %%
+
+def a1(title, cell_range):
+  """Quote a worksheet title into an A1 range"""
+  title = title.replace("'", "''")
+  return f"'{title}'!{cell_range}"
+
+class SheetBatch:
+  """Every Google Sheets call SheetAPI makes goes through here. Structural changes (duplicates, visibility, deletes and the
+  final reorder) and value writes are queued and sent as a handful of spreadsheets.batchUpdate and values.batchUpdate calls"""
+  def __init__(self, workbook, max_requests=100, limiter=None):
+    self.workbook = workbook
+    self.max_requests = max_requests
+    #every call waits its turn in the quota limiter and is retried with backoff when Google pushes back
+    self.limiter = limiter or QuotaLimiter()
+    self.round_trips = 0
+
+    self.requests = []
+    self.values = {"RAW": [], "USER_ENTERED": []}
+    self.next_sheet_id = None
+
+  def sheets(self):
+    """Fetch the properties of every worksheet in the workbook"""
+    self.round_trips += 1
+    sheets = [i["properties"] for i in self.limiter.call("read", self.workbook.fetch_sheet_metadata)["sheets"]]
+    self.next_sheet_id = max(i["sheetId"] for i in sheets) + 1
+    return sheets
+
+  def get(self, ranges, value_render_option="FORMATTED_VALUE", major_dimension="ROWS"):
+    """Read several A1 ranges in one values.batchGet, returns a list of value grids in the same order"""
+    self.round_trips += 1
+    response = self.limiter.call("read", self.workbook.values_batch_get, ranges, params={"valueRenderOption": value_render_option, "majorDimension": major_dimension})
+    grids = [i.get("values", []) for i in response.get("valueRanges", [])]
+    instrument.count("cells_read", sum(len(row) for grid in grids for row in grid))
+    return grids
+
+  def new_sheet_id(self):
+    """Hand out an id nobody in the workbook is using yet, so new worksheets can be referenced before they exist"""
+    sheet_id = self.next_sheet_id
+    self.next_sheet_id += 1
+    return sheet_id
+
+  def duplicate(self, source_id, title):
+    """Queue a copy of the source worksheet, returns the id the new worksheet will have"""
+    sheet_id = self.new_sheet_id()
+    self.requests.append({"duplicateSheet": {"sourceSheetId": source_id, "newSheetName": title, "newSheetId": sheet_id}})
+    return sheet_id
+
+  def set_hidden(self, sheet_id, hidden):
+    self.requests.append({"updateSheetProperties": {"properties": {"sheetId": sheet_id, "hidden": hidden}, "fields": "hidden"}})
+
+  def delete(self, sheet_id):
+    self.requests.append({"deleteSheet": {"sheetId": sheet_id}})
+
+  def reorder(self, sheet_ids):
+    #moving the sheets into place one index at a time, the same way gspread's reorder_worksheets does
+    for idx, sheet_id in enumerate(sheet_ids):
+      self.requests.append({"updateSheetProperties": {"properties": {"sheetId": sheet_id, "index": idx}, "fields": "index"}})
+
+  def write(self, title, cell_range, values, raw=True):
+    self.values["RAW" if raw else "USER_ENTERED"].append({"range": a1(title, cell_range), "values": values})
+
+  def pending(self):
+    return len(self.requests) + sum(len(i) for i in self.values.values())
+
+  def clear(self):
+    self.requests = []
+    self.values = {"RAW": [], "USER_ENTERED": []}
+
+  def flush(self):
+    """Send everything queued, structural changes first so value writes can target freshly duplicated worksheets.
+    Requests are only dropped from the queue once their call succeeds"""
+    while self.requests:
+      self.limiter.call("write", self.workbook.batch_update, {"requests": self.requests[:self.max_requests]})
+      self.round_trips += 1
+      self.requests = self.requests[self.max_requests:]
+
+    for option, data in self.values.items():
+      while data:
+        self.limiter.call("write", self.workbook.values_batch_update, {"valueInputOption": option, "data": data[:self.max_requests]})
+        self.round_trips += 1
+        instrument.count("cells_written", sum(len(row) for i in data[:self.max_requests] for row in i["values"]))
+        del data[:self.max_requests]
@@ -0,0 +1,65 @@
+import os
+from time import sleep, monotonic
+
+# %%
+
+class StatementWatcher:
+  """Polls a statements folder for csv files that are new or changed. Polling works the same on every platform and a
+  folder of statements is cheap to list, only each file's size and modification time are looked at"""
+  def __init__(self, csv_dir, interval=1.0, debounce=2.0, retry=60.0):
+    self.csv_dir = csv_dir
+    self.interval = interval
+    self.debounce = debounce
+    self.retry = retry
+    #statements that are already there when watching starts count as seen
+    self.seen = self.poll()
+    #statements wait() handed out that weren't marked seen yet, path -> (signature, when they were handed out)
+    self.handed_out = {}
+
+  def poll(self):
+    """(modification time, size) of every csv in the folder"""
+    signatures = {}
+    with os.scandir(self.csv_dir) as entries:
+      for entry in entries:
+        if entry.name.lower().endswith(".csv") and entry.is_file():
+          stat = entry.stat()
+          signatures[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return signatures
+
+  def wait(self):
+    """Block until statements were added or changed and then nothing moved for `debounce` seconds, so a burst of exports
+    (or one that's still being written) is picked up as a single batch. Returns their paths. A statement that isn't passed
+    to mark_seen() afterwards, e.g. because ingesting it failed, comes back once it changes or `retry` seconds went by"""
+    pending = {}
+    last_change = None
+    while True:
+      sleep(self.interval)
+      current = self.poll()
+      changed = {path: signature for path, signature in current.items()
+                 if self.seen.get(path) != signature and pending.get(path) != signature and not self.__held_back(path, signature)}
+      if changed:
+        pending.update(changed)
+        last_change = monotonic()
+      #statements removed from the folder stay in the transaction store, there's nothing to sync for them
+      for path in [i for i in self.seen if i not in current]:
+        del self.seen[path]
+      for path in [i for i in self.handed_out if i not in current]:
+        del self.handed_out[path]
+      pending = {path: signature for path, signature in pending.items() if path in current}
+
+      if pending and monotonic() - last_change >= self.debounce:
+        now = monotonic()
+        self.handed_out.update({path: (signature, now) for path, signature in pending.items()})
+        return sorted(pending)
+
+  def __held_back(self, path, signature):
+    """An unchanged statement that failed recently isn't retried on every poll"""
+    signature_out, handed_out = self.handed_out.get(path, (None, None))
+    return signature_out == signature and monotonic() - handed_out < self.retry
+
+  def mark_seen(self, files):
+    """Record statements wait() returned as handled, as they were when it returned them. One that changed since is picked
+    up again"""
+    for path in files:
+      if path in self.handed_out:
+        self.seen[path] = self.handed_out.pop(path)[0]
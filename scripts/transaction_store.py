@@ -0,0 +1,101 @@
+import sqlite3
+import pandas as pd
+
+# %%
+
+class TransactionStore:
+  """SQLite copy of every transaction that has been parsed, so history outlives its statements and is never reparsed.
+  Rows are identified by (Date, Description, Amount, Count, Source) like the in-memory deduplication, so the same payment on
+  two accounts is two rows, and every statement that went in is remembered by its hash. Credit card payments are stored too and only filtered out when reading, that way a change
+  to the category rules can relabel every row without losing any"""
+  def __init__(self, path, schema_version):
+    self.path = path
+    #the CLI fills the store on a background thread and keeps using it on the main one, never both at once
+    self.connection = sqlite3.connect(path, check_same_thread=False)
+    self.__create(schema_version)
+
+  def __meta(self, key):
+    row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+  def __set_meta(self, key, value):
+    self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+  def __create(self, schema_version):
+    with self.connection:
+      self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+      #rows normalized by older parsing code can't be trusted, start over from the statements on disk
+      if self.__meta("schema_version") not in (None, str(schema_version)):
+        self.connection.execute("DROP TABLE IF EXISTS transactions")
+        self.connection.execute("DROP TABLE IF EXISTS files")
+        self.connection.execute("DELETE FROM meta")
+
+      #dates are ISO strings so they sort and range-compare as text, the primary key doubles as the date index
+      self.connection.execute("""CREATE TABLE IF NOT EXISTS transactions (
+        date TEXT NOT NULL, description TEXT NOT NULL, amount INTEGER NOT NULL, count INTEGER NOT NULL, category TEXT, source TEXT NOT NULL,
+        PRIMARY KEY (date, description, amount, count, source))""")
+      self.connection.execute("CREATE INDEX IF NOT EXISTS transactions_category ON transactions (category, date)")
+      self.connection.execute("CREATE INDEX IF NOT EXISTS transactions_description ON transactions (description)")
+      self.connection.execute("CREATE TABLE IF NOT EXISTS files (hash TEXT PRIMARY KEY, name TEXT, bank TEXT, rows INTEGER)")
+      self.__set_meta("schema_version", schema_version)
+
+  def __len__(self):
+    return self.connection.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+  def last_row(self):
+    """Rowid of the most recently inserted transaction, query(after=...) reads back only what was added since"""
+    return self.connection.execute("SELECT COALESCE(MAX(rowid), 0) FROM transactions").fetchone()[0]
+
+  def has_file(self, file_hash):
+    return self.connection.execute("SELECT 1 FROM files WHERE hash = ?", (file_hash,)).fetchone() is not None
+
+  def add(self, df, file_hash, name, bank):
+    """Insert a parsed statement, rows that are already stored are skipped. Returns the number of new rows"""
+    rows = zip(df["Date"].dt.strftime("%Y-%m-%d"), df["Description"], df["Amount"].tolist(), df["Count"].tolist(),
+               df["Category"].astype(object).where(df["Category"].notna(), None) if "Category" in df else [None] * len(df),
+               df["Source"] if "Source" in df else [bank] * len(df))
+    with self.connection:
+      before = self.connection.total_changes
+      self.connection.executemany("INSERT OR IGNORE INTO transactions (date, description, amount, count, category, source) VALUES (?, ?, ?, ?, ?, ?)", rows)
+      added = self.connection.total_changes - before
+      self.connection.execute("INSERT OR REPLACE INTO files (hash, name, bank, rows) VALUES (?, ?, ?, ?)", (file_hash, name, bank, added))
+    return added
+
+  def recategorize(self, fingerprint, categorize):
+    """Relabel every stored row with categorize (a Description column -> Category column function) unless the rules with
+    this fingerprint already did. Only the distinct descriptions are categorized"""
+    if self.__meta("categories") == fingerprint:
+      return
+    descriptions = pd.Series([row[0] for row in self.connection.execute("SELECT DISTINCT description FROM transactions")], dtype=object)
+    with self.connection:
+      self.connection.executemany("UPDATE transactions SET category = ? WHERE description = ?", zip(categorize(descriptions), descriptions))
+      self.__set_meta("categories", fingerprint)
+
+  def query(self, start=None, end=None, category=None, description=None, after=None):
+    """Transactions dated in [start, end) with an optional exact category and description, ordered by date like
+    transaction_df. Credit card payments are left out. `after` limits it to rows inserted after that last_row()"""
+    clauses = ["(category IS NULL OR category != 'Credit Card')"]
+    params = []
+    if after is not None:
+      clauses.append("rowid > ?")
+      params.append(after)
+    if start is not None:
+      clauses.append("date >= ?")
+      params.append(pd.Timestamp(start).strftime("%Y-%m-%d"))
+    if end is not None:
+      clauses.append("date < ?")
+      params.append(pd.Timestamp(end).strftime("%Y-%m-%d"))
+    if category is not None:
+      clauses.append("category = ?")
+      params.append(category)
+    if description is not None:
+      clauses.append("description = ?")
+      params.append(description)
+
+    df = pd.read_sql_query(f"""SELECT date AS Date, description AS Description, amount AS Amount, category AS Category, source AS Source
+      FROM transactions WHERE {' AND '.join(clauses)} ORDER BY date, rowid""", self.connection, params=params)
+    df["Date"] = pd.to_datetime(df["Date"], format="%Y-%m-%d")
+    return df
+
+  def close(self):
+    self.connection.close()
@@ -0,0 +1,44 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+from data_parse import DataParse
+
+# %%
+
+DISCOVER = """Trans. Date,Post Date,Description,Amount,Category
+01/05/2024,01/05/2024,VENMO PAYMENT,20.00,Services
+01/06/2024,01/06/2024,WEGMANS #45,31.20,Supermarkets
+"""
+
+USAA = """Date,Description,Original Description,Category,Amount,Status
+2024-01-05,VENMO PAYMENT,VENMO PAYMENT,Transfer,-20.00,Posted
+2024-01-07,SUNOCO 0123,SUNOCO 0123,Gas,-40.00,Posted
+"""
+
+def parse(csv_dir, **settings):
+  dataparse = DataParse(str(csv_dir), interactive=False)
+  dataparse.set_settings_file({"categories": {"Food": ["wegmans"], "Car": ["sunoco"]}, "cache": False, **settings})
+  dataparse.get_transaction_df()
+  return dataparse.transaction_df
+
+def statements(csv_dir):
+  csv_dir.mkdir(exist_ok=True)
+  (csv_dir / "discover.csv").write_text(DISCOVER)
+  (csv_dir / "usaa.csv").write_text(USAA)
+  return csv_dir
+
+def rows(df):
+  return sorted(df[["Date", "Description", "Amount", "Source"]].astype({"Source": object}).values.tolist())
+
+def test_same_payment_on_two_accounts_is_kept_twice(tmp_path):
+  df = parse(statements(tmp_path), store=False)
+  assert (df["Description"] == "VENMO PAYMENT").sum() == 2
+
+def test_store_keeps_the_same_rows_as_memory(tmp_path):
+  #the store's key and the in-memory deduplication have to agree on what makes a row unique
+  in_memory = parse(statements(tmp_path / "memory"), store=False)
+  stored = parse(statements(tmp_path / "store"))
+  assert rows(stored) == rows(in_memory)
+  #reading the same statements again adds nothing
+  assert rows(parse(tmp_path / "store")) == rows(in_memory)
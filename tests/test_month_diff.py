@@ -0,0 +1,75 @@
+import os
+import sys
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+from month_diff import diff_month
+
+# %%
+
+COLUMNS = ["Date", "Description", "Amount", "Category"]
+
+def worksheet(*rows):
+  """A month worksheet as SheetAPI snapshots it, row i is worksheet row i + 2 and blank rows are all empty strings"""
+  df = pd.DataFrame([list(i) if i else [""] * 4 for i in rows], columns=COLUMNS)
+  #amounts that aren't numbers are kept as typed
+  amounts = pd.to_numeric(df["Amount"], errors="coerce")
+  df["Amount"] = amounts.astype(object).where(amounts.notna(), df["Amount"])
+  return df
+
+def incoming(*rows):
+  return pd.DataFrame([list(i) for i in rows], columns=COLUMNS)
+
+def apply(sheet, writes):
+  """The worksheet rows after the writes, trailing blank rows dropped like the API does"""
+  rows = [["" if pd.isna(i) else i for i in row] for row in sheet.values.tolist()]
+  for offset, values in writes:
+    rows += [[""] * 4] * (offset + len(values) - len(rows))
+    rows[offset:offset + len(values)] = values
+  while rows and rows[-1] == [""] * 4:
+    rows.pop()
+  return rows
+
+A = ("01/02/2024", "WEGMANS #45", 10.0, "Food")
+B = ("01/20/2024", "SUNOCO 0123", 30.0, "Car")
+C = ("01/25/2024", "NETFLIX.COM", 15.0, "Media")
+
+def test_nothing_new_writes_nothing():
+  merged, writes = diff_month(incoming(A, B), worksheet(A, B))
+  assert writes == []
+  assert merged.values.tolist() == [list(A), list(B)]
+
+def test_appends_after_the_last_row():
+  merged, writes = diff_month(incoming(A, B, C), worksheet(A, B))
+  assert writes == [(2, [list(C)])]
+
+def test_blank_row_is_not_overwritten():
+  #worksheet rows 2=A, 3=blank, 4=B plus an incoming C, B must not be written over
+  sheet = worksheet(A, None, B)
+  merged, writes = diff_month(incoming(A, B, C), sheet)
+  assert apply(sheet, writes) == [list(A), list(B), list(C)]
+  assert merged.values.tolist() == [list(A), list(B), list(C)]
+
+def test_gaps_close_up_and_leftover_rows_are_cleared():
+  sheet = worksheet(A, None, None, B)
+  early = ("01/01/2024", "AMZN MKTP US", 5.0, "Personal")
+  merged, writes = diff_month(incoming(early, A, B), sheet)
+  assert apply(sheet, writes) == [list(early), list(A), list(B)]
+
+def test_worksheet_categories_are_kept():
+  #the user recategorized A on the worksheet, only the new row is written
+  edited = A[:3] + ("Gift",)
+  merged, writes = diff_month(incoming(A, B), worksheet(edited))
+  assert writes == [(1, [list(B)])]
+  assert merged.values.tolist()[0] == list(edited)
+
+def test_rows_typed_into_the_sheet_are_left_alone():
+  #a note with a date but no cost, and one without a date at all, stay where they are and are never rewritten
+  note = ("01/20/2024", "split with Sam", "", "")
+  header = ("Reimbursed", "", "n/a", "")
+  sheet = worksheet(A, note, header, B)
+  merged, writes = diff_month(incoming(A, B, C), sheet)
+  assert writes == [(4, [list(C)])]
+  assert apply(sheet, writes) == [list(A), list(note), list(header), list(B), list(C)]
+  merged, writes = diff_month(incoming(A, B), worksheet(A, note, header, B))
+  assert writes == []
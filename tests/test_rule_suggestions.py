@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+from rule_suggestions import suggest_rules
+
+# %%
+
+#Bank of America style descriptions, every one starts with how the card was used
+PREFIXED = {
+  "CHECKCARD 0102 WEGMANS #45 PITTSFORD NY": 12, "CHECKCARD 0109 WEGMANS #112 PITTSFORD NY": 9,
+  "CHECKCARD 0105 SUNOCO 0123 ROCHESTER NY": 10, "CHECKCARD 0118 SUNOCO 0877 ROCHESTER NY": 6,
+  "CHECKCARD 0110 NETFLIX.COM LOS GATOS CA": 8,
+  "PURCHASE AUTHORIZED ON 01/03 TARGET T-1234": 7, "PURCHASE AUTHORIZED ON 01/12 SHELL OIL 5531": 5,
+  "PURCHASE AUTHORIZED ON 01/20 SQ *BLUE BOTTLE": 4,
+}
+
+def test_suggests_merchants_not_bank_prefixes():
+  suggestions = suggest_rules(list(PREFIXED), list(PREFIXED.values()))
+  rules = [rule for rule, _, _ in suggestions]
+  assert rules[:2] == ["wegmans", "sunoco"]
+  assert {"target", "shell oil", "sq *blue bottle"} <= set(rules)
+  assert not [rule for rule in rules if "checkcard" in rule or "purchase" in rule]
+
+def test_every_rule_stays_within_one_merchant():
+  suggestions = suggest_rules(list(PREFIXED), list(PREFIXED.values()))
+  for rule, rows, _ in suggestions:
+    merchants = {i.split()[2] if i.startswith("CHECKCARD") else i.split()[4] for i in PREFIXED if rule in i.lower()}
+    assert len(merchants) == 1, rule
+  assert sum(rows for _, rows, _ in suggestions) == sum(PREFIXED.values())
+
+def test_plain_descriptions_cluster_by_merchant():
+  suggestions = suggest_rules(["WEGMANS #45", "WEGMANS #112", "AMZN Mktp US*1A2B3C", "NETFLIX.COM"], [3, 2, 4, 1])
+  assert suggestions[0] == ("wegmans", 5, "WEGMANS #45")
+  assert [rule for rule, _, _ in suggestions[1:]] == ["amzn mktp", "netflix.com"]